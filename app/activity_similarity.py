@@ -1,50 +1,230 @@
-from typing import Dict, Tuple
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import Future
+from app.embedding_cache import get_embedding_cache, normalize_text
+from app.metrics import BEDROCK_SECONDS
+from app.ngram_similarity import NgramSimilarityEngine
+from llm_agent.bedrock_client import get_bedrock_runtime
 import numpy as np
-import boto3
-import json
+import asyncio
 import logging  # Added for error logging
+import os
+import threading
+import time
 
 logger = logging.getLogger(__name__)  # Added logger setup
 
+EMBED_MODEL_ID = "cohere.embed-english-v3"
+EMBED_DIMENSIONS = 1024
+EMBED_BATCH_LIMIT = 96  # Cohere accepts at most 96 texts per request
+SIMILARITY_THRESHOLD = 0.85
+DEFAULT_BATCH_WINDOW_MS = 5.0
+
+
+class QueryBatcher:
+    """
+    Groups concurrent queries into micro-batches. The first query of a
+    batch becomes its leader: it waits out the window, closes the batch and
+    resolves every member's future; the others just wait on theirs.
+    Identical texts within a batch share one slot. If the leader fails or is
+    cancelled, the members it left unresolved rejoin and one of them leads
+    the next batch.
+    """
+
+    def __init__(self, max_batch: int = EMBED_BATCH_LIMIT):
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._open: Optional[Dict[str, Future]] = None
+
+    def join(self, text: str):
+        with self._lock:
+            leader = self._open is None
+            if leader:
+                self._open = {}
+            batch = self._open
+            future = batch.get(text)
+            if future is None:
+                future = batch[text] = Future()
+            if len(batch) >= self.max_batch:
+                self._open = None
+        return batch, future, leader
+
+    def close(self, batch: Dict[str, Future]) -> List[str]:
+        with self._lock:
+            if self._open is batch:
+                self._open = None
+        return list(batch)
+
+
 class ActivitySimilarityEngine:
-    def __init__(self, activity_keys):
-        self.client = boto3.client("bedrock-runtime")
+    threshold = SIMILARITY_THRESHOLD
+
+    def __init__(self, activity_keys, cache=None, runtime=None, batch_window_ms=None):
+        self.runtime = runtime or get_bedrock_runtime()
+        self.cache = cache if cache is not None else get_embedding_cache()
+        if batch_window_ms is None:
+            batch_window_ms = float(os.getenv("EMBED_BATCH_WINDOW_MS", DEFAULT_BATCH_WINDOW_MS))
+        self.batch_window = batch_window_ms / 1000.0
+        self._batcher = QueryBatcher()
         self.activity_keys = list(activity_keys)
         self.embeddings = self._embed(self.activity_keys)
 
-    def _embed(self, texts):
+    def _embed(self, texts, input_type="search_document"):
+        """
+        Embed texts, serving repeated (model, input_type, normalized text)
+        lookups from the persistent cache and sending only misses to Bedrock.
+        """
+        normalized, vectors, missing = self._cached(texts, input_type)
+        if missing:
+            try:
+                fresh = {}
+                for batch in _batches(missing):
+                    fresh.update(zip(batch, self._invoke_embed(batch, input_type)))
+                self._store(vectors, fresh, input_type)
+            except Exception as e:
+                logger.error("Embedding failed: %s", e)
+        return _stack(normalized, vectors)
+
+    async def _aembed(self, texts, input_type="search_document"):
+        normalized, vectors, missing = await self._off_loop(self._cached, texts, input_type)
+        if missing:
+            try:
+                fresh = {}
+                for batch in _batches(missing):
+                    fresh.update(zip(batch, await self._ainvoke_embed(batch, input_type)))
+                await self._off_loop(self._store, vectors, fresh, input_type)
+            except Exception as e:
+                logger.error("Embedding failed: %s", e)
+        return _stack(normalized, vectors)
+
+    async def _off_loop(self, fn, *args):
+        """Run a cache read or write on the default executor; the SQLite calls block."""
+        if self.cache is None:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    def _cached(self, texts, input_type):
+        normalized = [normalize_text(text) for text in texts]
+        vectors: Dict[str, np.ndarray] = {}
+        if self.cache is not None:
+            vectors.update(self.cache.get_many(EMBED_MODEL_ID, input_type, normalized))
+        missing = [text for text in dict.fromkeys(normalized) if text not in vectors]
+        return normalized, vectors, missing
+
+    def _store(self, vectors, fresh, input_type):
+        vectors.update(fresh)
+        if self.cache is not None:
+            self.cache.put_many(EMBED_MODEL_ID, input_type, fresh)
+
+    def _invoke_embed(self, texts, input_type):
+        started, outcome = time.perf_counter(), "error"
         try:
-            response = self.client.invoke_model(
-                modelId="cohere.embed-english-v3",
-                body=json.dumps({
-                    "texts": texts,
-                    "input_type": "search_document"
-                })
-            )
-            body = json.loads(response["body"].read())
-            return np.array(body["embeddings"])
-        except Exception as e:
-            logger.error("Embedding failed: %s", e)
-            # Fallback: Return zeros array with expected shape (assuming 768 dimensions for Cohere)
-            return np.zeros((len(texts), 768))
+            body = self.runtime.invoke_model(EMBED_MODEL_ID, {"texts": texts, "input_type": input_type})
+            outcome = "ok"
+        finally:
+            BEDROCK_SECONDS.observe(time.perf_counter() - started, "embed", outcome)
+        return [np.asarray(vector, dtype=np.float32) for vector in body["embeddings"]]
+
+    async def _ainvoke_embed(self, texts, input_type):
+        started, outcome = time.perf_counter(), "error"
+        try:
+            body = await self.runtime.ainvoke_model(EMBED_MODEL_ID, {"texts": texts, "input_type": input_type})
+            outcome = "ok"
+        finally:
+            BEDROCK_SECONDS.observe(time.perf_counter() - started, "embed", outcome)
+        return [np.asarray(vector, dtype=np.float32) for vector in body["embeddings"]]
 
     def find_closest(self, query: str) -> Tuple[str, float]:
+        # Not batched: a blocking caller would sit out the whole window even
+        # when no other query is pending. Identical concurrent queries are
+        # already coalesced by the rule engine's SingleFlight.
         try:
-            response = self.client.invoke_model(
-                modelId="cohere.embed-english-v3",
-                body=json.dumps({
-                    "texts": [query],
-                    "input_type": "search_query"
-                })
-            )
-            body = json.loads(response["body"].read())
-            query_vec = np.array(body["embeddings"][0])
-
-            scores = self.embeddings @ query_vec
-            idx = int(scores.argmax())
-
-            return self.activity_keys[idx], float(scores[idx])
+            return self._best_matches(self._embed([query], "search_query"))[0]
         except Exception as e:
             logger.error("Similarity search failed: %s", e)
             # Fallback: Return the first activity with score 0.0
-            return self.activity_keys[0], 0.0
\ No newline at end of file
+            return self.activity_keys[0], 0.0
+
+    async def afind_closest(self, query: str) -> Tuple[str, float]:
+        try:
+            if not self.batch_window:
+                return self._best_matches(await self._aembed([query], "search_query"))[0]
+
+            text = normalize_text(query)
+            while True:
+                batch, future, leader = self._batcher.join(text)
+                if leader:
+                    try:
+                        await asyncio.sleep(self.batch_window)
+                        texts = self._batcher.close(batch)
+                        self._settle(batch, texts, await self._aembed(texts, "search_query"))
+                    finally:
+                        self._abandon(batch)
+                try:
+                    # Shielded: a member timing out or being cancelled must not cancel the shared future
+                    return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self._follower_timeout())
+                except _BatchAbandoned:
+                    continue
+        except Exception as e:
+            logger.error("Similarity search failed: %s", e)
+            return self.activity_keys[0], 0.0
+
+    def _settle(self, batch, texts, query_vecs):
+        """Score a closed batch with one matrix multiply and resolve its futures."""
+        for text, match in zip(texts, self._best_matches(query_vecs)):
+            batch[text].set_result(match)
+
+    def _abandon(self, batch):
+        """
+        Close the batch and release whatever the leader left unresolved (it
+        raised or was cancelled), so those members retry instead of sharing
+        the leader's failure.
+        """
+        self._batcher.close(batch)
+        for future in list(batch.values()):
+            if not future.done():
+                future.set_exception(_BatchAbandoned())
+
+    def _follower_timeout(self) -> float:
+        # One batch is a single embed call, bounded by the Bedrock call deadline
+        return self.batch_window + getattr(self.runtime, "call_timeout", 30.0) + 1.0
+
+    def _best_matches(self, query_vecs) -> List[Tuple[str, float]]:
+        scores = query_vecs @ self.embeddings.T
+        best = scores.argmax(axis=1)
+        return [
+            (self.activity_keys[int(idx)], float(scores[row, idx]))
+            for row, idx in enumerate(best)
+        ]
+
+
+class _BatchAbandoned(Exception):
+    """Set on the futures a batch leader left unresolved."""
+
+
+def _batches(texts):
+    for start in range(0, len(texts), EMBED_BATCH_LIMIT):
+        yield texts[start:start + EMBED_BATCH_LIMIT]
+
+
+def _stack(normalized, vectors):
+    # Texts that could not be embedded fall back to zero vectors
+    dims = next((len(vector) for vector in vectors.values()), EMBED_DIMENSIONS)
+    zeros = np.zeros(dims, dtype=np.float32)
+    return np.array([vectors.get(text, zeros) for text in normalized], dtype=np.float32).reshape(len(normalized), dims)
+
+
+SIMILARITY_BACKENDS = {
+    "bedrock": ActivitySimilarityEngine,
+    "ngram": NgramSimilarityEngine
+}
+
+
+def create_similarity_engine(activity_keys):
+    """
+    Build the activity matcher selected by SIMILARITY_BACKEND
+    ("bedrock" by default, "ngram" for the offline matcher).
+    """
+    backend = os.getenv("SIMILARITY_BACKEND", "bedrock").strip().lower()
+    if backend not in SIMILARITY_BACKENDS:
+        raise ValueError(f"Unknown SIMILARITY_BACKEND: {backend}")
+    return SIMILARITY_BACKENDS[backend](activity_keys)
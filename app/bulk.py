@@ -0,0 +1,344 @@
+"""
+Offline Bulk Classifier
+
+Classifies project dumps (JSONL, CSV or Excel) across a process pool
+without going through the API server. Each worker loads the configuration
+once, input is read in chunks and results are written in input order.
+
+Usage:
+    python -m app.bulk --input projects.jsonl --output results.jsonl
+    python -m app.bulk --input projects.xlsx --output results.parquet --workers 8 --chunk-size 1000
+
+CSV / Excel columns use dot paths for nested fields, e.g. `caf.project_sector`
+or `form1_part_a.proposed_capacity`. Only columns that map to numeric
+canonical fields are read as numbers; other cells stay text.
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List
+
+from app.config_loader import load_config
+from app.pipeline import ClassificationPipeline
+from app.rule_engine import METRIC_SEMANTICS
+
+
+INPUT_FORMATS = {".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv", ".xlsx": "excel"}
+OUTPUT_FORMATS = {".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet"}
+
+PARQUET_COLUMNS = [
+    "record", "status", "category", "decision_mode", "triggered_rule",
+    "confidence", "clearance_authority", "appraisal_body", "result"
+]
+
+
+# ============================================================================
+# WORKER
+# ============================================================================
+_worker_pipeline = None
+
+
+def _init_worker(config_dir: str):
+    global _worker_pipeline
+    _worker_pipeline = ClassificationPipeline(config_dir=config_dir)
+
+
+def _classify_chunk(items: List[Any]) -> List[Dict]:
+    """
+    Classify one chunk. JSONL records arrive as raw lines so parsing also
+    happens in the worker; CSV / Excel records arrive as dicts.
+    """
+    payloads = []
+    errors = {}
+    for idx, item in enumerate(items):
+        if isinstance(item, str):
+            try:
+                item = json.loads(item)
+            except ValueError as e:
+                errors[idx] = {"status": "ERROR", "error": f"Invalid JSON: {e}"}
+                item = None
+        payloads.append(item)
+
+    results = _worker_pipeline.run_batch(payloads)
+    return [errors.get(idx, result) for idx, result in enumerate(results)]
+
+
+# ============================================================================
+# READERS
+# ============================================================================
+def numeric_columns(config_dir: str) -> FrozenSet[str]:
+    """
+    Source paths (CSV / Excel column names) of the field_mapping.json
+    entries whose canonical field is numeric: the rule metrics and the
+    fields of threshold overrides.
+    """
+    numeric_fields = set().union(*METRIC_SEMANTICS.values())
+    override_rules = load_config(config_dir, "override_rules")
+    numeric_paths = {
+        rule["canonical_path"] for rule in override_rules.get("absolute_overrides", [])
+        if "trigger_condition" in rule
+    }
+    columns = set()
+    for field_name, config in load_config(config_dir, "field_mapping").items():
+        path = config["canonical_path"]
+        if field_name in numeric_fields or path.rsplit(".", 1)[-1] in numeric_fields or path in numeric_paths:
+            columns.update(config["sources"])
+    return frozenset(columns)
+
+
+def read_jsonl(path: str, numeric: FrozenSet[str] = frozenset()) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield line
+
+
+def read_csv(path: str, numeric: FrozenSet[str] = frozenset()) -> Iterator[Dict]:
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            yield _nest_row(row.items(), numeric)
+
+
+def read_excel(path: str, numeric: FrozenSet[str] = frozenset()) -> Iterator[Dict]:
+    import openpyxl
+
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        headers = next(rows, None) or []
+        for values in rows:
+            if any(value not in (None, "") for value in values):
+                yield _nest_row(zip(headers, values), numeric)
+    finally:
+        wb.close()
+
+
+READERS = {"jsonl": read_jsonl, "csv": read_csv, "excel": read_excel}
+
+
+def _nest_row(cells: Iterable, numeric: FrozenSet[str] = frozenset()) -> Dict:
+    """Turn flat `a.b.c` columns into nested payload dicts, dropping empty cells."""
+    payload: Dict[str, Any] = {}
+    for header, value in cells:
+        if not header:
+            continue
+        column = str(header).strip()
+        value = _coerce_cell(value, column in numeric)
+        if value is None:
+            continue
+        keys = column.split(".")
+        current = payload
+        for key in keys[:-1]:
+            current = current.setdefault(key, {})
+        current[keys[-1]] = value
+    return payload
+
+
+def _coerce_cell(value, numeric: bool = False):
+    """
+    Cell value for the payload; None drops the cell. Text is parsed as a
+    number only in numeric columns, so codes such as "007" keep their
+    digits. NaN and infinite values count as empty.
+    """
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if not isinstance(value, str):
+        return value
+    text = value.strip()
+    if text == "":
+        return None
+    lowered = text.lower()
+    if lowered in ("true", "yes"):
+        return True
+    if lowered in ("false", "no"):
+        return False
+    if not numeric:
+        return text
+    try:
+        number = float(text.replace(",", ""))
+    except ValueError:
+        return text
+    if not math.isfinite(number):
+        return None
+    return int(number) if number.is_integer() and "." not in text else number
+
+
+# ============================================================================
+# WRITERS
+# ============================================================================
+class JSONLWriter:
+    def __init__(self, path: str):
+        self.f = open(path, "w", encoding="utf-8")
+
+    def write(self, records: List[Dict]):
+        self.f.write("".join(json.dumps(record, default=str) + "\n" for record in records))
+
+    def close(self):
+        self.f.close()
+
+
+class ParquetWriter:
+    def __init__(self, path: str):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("❌ Parquet output requires pyarrow: pip install pyarrow")
+
+        self.pa = pa
+        self.schema = pa.schema([
+            ("record", pa.int64()),
+            ("status", pa.string()),
+            ("category", pa.string()),
+            ("decision_mode", pa.string()),
+            ("triggered_rule", pa.string()),
+            ("confidence", pa.float64()),
+            ("clearance_authority", pa.string()),
+            ("appraisal_body", pa.string()),
+            ("result", pa.string()),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, records: List[Dict]):
+        columns = {name: [] for name in PARQUET_COLUMNS}
+        for record in records:
+            for name in PARQUET_COLUMNS[:-1]:
+                value = record.get(name)
+                if name == "triggered_rule" and value is None:
+                    value = record.get("reason")
+                columns[name].append(value)
+            columns["result"].append(json.dumps(record, default=str))
+        self.writer.write_table(self.pa.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {"jsonl": JSONLWriter, "parquet": ParquetWriter}
+
+
+# ============================================================================
+# BULK RUN
+# ============================================================================
+def _chunks(records: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(records)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def classify_file(
+    input_path: str,
+    output_path: str,
+    config_dir: str = "app/config",
+    workers: int = None,
+    chunk_size: int = 500,
+    input_format: str = None,
+    output_format: str = None
+) -> Dict:
+    input_format = input_format or INPUT_FORMATS.get(Path(input_path).suffix.lower())
+    output_format = output_format or OUTPUT_FORMATS.get(Path(output_path).suffix.lower())
+    if input_format not in READERS:
+        raise ValueError(f"Unsupported input format: {input_path}")
+    if output_format not in WRITERS:
+        raise ValueError(f"Unsupported output format: {output_path}")
+
+    workers = workers or os.cpu_count() or 1
+    reader = READERS[input_format](input_path, numeric_columns(config_dir))
+    writer = WRITERS[output_format](output_path)
+
+    statuses = Counter()
+    categories = Counter()
+    total = 0
+    started = time.perf_counter()
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config_dir,)) as pool:
+            # Keep a bounded window of chunks in flight and drain it in submission order
+            in_flight = deque()
+            chunks = _chunks(reader, chunk_size)
+
+            def drain_one():
+                nonlocal total
+                results = in_flight.popleft().result()
+                records = []
+                for result in results:
+                    records.append({"record": total, **result})
+                    statuses[result.get("status")] += 1
+                    if result.get("category"):
+                        categories[result["category"]] += 1
+                    total += 1
+                writer.write(records)
+
+            for chunk in chunks:
+                in_flight.append(pool.submit(_classify_chunk, chunk))
+                if len(in_flight) >= workers * 2:
+                    drain_one()
+            while in_flight:
+                drain_one()
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "records": total,
+        "elapsed_seconds": round(elapsed, 3),
+        "records_per_second": round(total / elapsed, 1) if elapsed else None,
+        "workers": workers,
+        "chunk_size": chunk_size,
+        "statuses": dict(statuses),
+        "categories": dict(categories)
+    }
+
+
+# ============================================================================
+# MAIN EXECUTION
+# ============================================================================
+def main():
+    parser = argparse.ArgumentParser(description='Classify a bulk project dump offline')
+    parser.add_argument('--input', required=True, help='Input file (.jsonl, .csv, .xlsx)')
+    parser.add_argument('--output', required=True, help='Output file (.jsonl, .parquet)')
+    parser.add_argument('--config-dir', default='app/config', help='Pipeline configuration directory')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=500, help='Records per worker task')
+    parser.add_argument('--input-format', choices=sorted(READERS), help='Override input format detection')
+    parser.add_argument('--output-format', choices=sorted(WRITERS), help='Override output format detection')
+
+    args = parser.parse_args()
+
+    if not Path(args.input).exists():
+        print(f"❌ Error: Input file not found: {args.input}")
+        return
+
+    print(f"🔄 Classifying {args.input} → {args.output}...")
+    stats = classify_file(
+        args.input,
+        args.output,
+        config_dir=args.config_dir,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        input_format=args.input_format,
+        output_format=args.output_format
+    )
+
+    print(f"✅ Results saved to {args.output}")
+    print(f"📊 {stats['records']} records in {stats['elapsed_seconds']}s "
+          f"({stats['records_per_second']} records/s, {stats['workers']} workers)")
+    for status, count in sorted(stats["statuses"].items(), key=lambda item: str(item[0])):
+        print(f"   - {status}: {count}")
+    for category, count in sorted(stats["categories"].items()):
+        print(f"   - category {category}: {count}")
+
+
+if __name__ == "__main__":
+    main()
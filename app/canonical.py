@@ -0,0 +1,73 @@
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# Top-level sections of a canonical project, in serialization order
+SECTIONS = (
+    "project_identity",
+    "validation_status",
+    "form1_part_a",
+    "capacity_normalization",
+    "derived_parameters",
+    "environmental_sensitivity"
+)
+_SECTION_NAMES = frozenset(SECTIONS)
+
+
+class CanonicalProject:
+    """
+    Canonical project document passed between pipeline stages.
+
+    The top-level layout is fixed (one slot per section); the sections
+    themselves stay plain dicts because their keys come from
+    field_mapping.json. Top-level keys outside SECTIONS land in `extra`.
+    Converted to a dict only at the edges (debug output, traces).
+    """
+    __slots__ = SECTIONS + ("extra", "similarity_used")
+
+    def __init__(self):
+        self.project_identity: Dict[str, Any] = {}
+        self.validation_status: Dict[str, Any] = {}
+        self.form1_part_a: Dict[str, Any] = {}
+        self.capacity_normalization: Dict[str, Any] = {}
+        self.derived_parameters: Dict[str, Any] = {}
+        self.environmental_sensitivity: Dict[str, Any] = {}
+        self.extra: Dict[str, Any] = {}
+        self.similarity_used = False
+
+    def section(self, name: str) -> Dict[str, Any]:
+        """Writable block for a top-level key, created on first use."""
+        if name in _SECTION_NAMES:
+            return getattr(self, name)
+        block = self.extra.get(name)
+        if not isinstance(block, dict):
+            block = self.extra[name] = {}
+        return block
+
+    def get(self, name: str, default: Any = None) -> Any:
+        if name in _SECTION_NAMES:
+            return getattr(self, name)
+        return self.extra.get(name, default)
+
+    def get_path(self, path: str) -> Optional[Any]:
+        """Dot-path lookup; None when any step is missing, None or not a dict."""
+        first, *rest = path.split(".")
+        current = self.get(first)
+        for key in rest:
+            if not isinstance(current, dict):
+                return None
+            current = current.get(key)
+            if current is None:
+                return None
+        return current
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """Top-level (key, value) pairs as they appear in to_dict()."""
+        for name in SECTIONS:
+            block = getattr(self, name)
+            if block or name in ("project_identity", "validation_status"):
+                yield name, block
+        yield from self.extra.items()
+        if self.similarity_used:
+            yield "_similarity_used", True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
@@ -1,8 +1,12 @@
 from typing import Dict, Optional
+from app.canonical import CanonicalProject
 
+# Canonical fields the total effective capacity is computed from
+CAPACITY_INPUTS = ("proposed_capacity", "existing_capacity")
 
-def normalize_capacity(canonical: dict) -> dict:
-    identity = canonical.get("project_identity", {})
+
+def normalize_capacity(canonical: CanonicalProject) -> CanonicalProject:
+    identity = canonical.project_identity
     sector = identity.get("sector", "").lower()
     activity = identity.get("activity", "").lower()
     proposal_type = identity.get("type_of_proposal", "").lower()
@@ -20,8 +24,8 @@ def normalize_capacity(canonical: dict) -> dict:
         proposal_type = "new"
         identity["type_of_proposal"] = "new"
 
-    form1 = canonical.get("form1_part_a", {})
-    cap_block = canonical.setdefault("capacity_normalization", {})
+    form1 = canonical.form1_part_a
+    cap_block = canonical.capacity_normalization
 
     # 🔑 Normalize proposed capacity (form1 → capacity_normalization)
     if "proposed_capacity" in form1 and "proposed_capacity" not in cap_block:
@@ -0,0 +1,15 @@
+import json
+import os
+
+# Pipeline component -> config file
+CONFIG_FILES = {
+    "field_mapping": "field_mapping.json",
+    "mandatory_rules": "mandatory_fields.json",
+    "override_rules": "override_rules.json",
+    "dss_rules": "dss_rules.json"
+}
+
+
+def load_config(config_dir, component):
+    with open(os.path.join(config_dir, CONFIG_FILES[component])) as f:
+        return json.load(f)
@@ -0,0 +1,138 @@
+from typing import Dict, Iterable, Optional
+from pathlib import Path
+import numpy as np
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = ".cache/embeddings.sqlite3"
+DEFAULT_MAX_ENTRIES = 100000
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(str(text).lower().split())
+
+
+class EmbeddingCache:
+    """
+    Disk-backed LRU cache of embedding vectors keyed by
+    (model id, input type, normalized text). Vectors are stored as float32
+    blobs in SQLite; the least recently used rows are evicted once the
+    table grows past `max_entries`.
+    """
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model_id TEXT NOT NULL,
+                input_type TEXT NOT NULL,
+                text TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model_id, input_type, text)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+    def get_many(self, model_id: str, input_type: str, texts: Iterable[str]) -> Dict[str, np.ndarray]:
+        texts = list(dict.fromkeys(texts))
+        if not texts:
+            return {}
+
+        found = {}
+        with self._lock:
+            for start in range(0, len(texts), 500):
+                batch = texts[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    "SELECT text, vector FROM embeddings WHERE model_id = ? AND input_type = ? "
+                    "AND text IN ({0})".format(placeholders),
+                    [model_id, input_type, *batch]
+                ).fetchall()
+                for text, blob in rows:
+                    found[text] = np.frombuffer(blob, dtype=np.float32)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model_id = ? AND input_type = ? AND text = ?",
+                    [(now, model_id, input_type, text) for text in found]
+                )
+        return found
+
+    def put_many(self, model_id: str, input_type: str, vectors: Dict[str, np.ndarray]):
+        if not vectors:
+            return
+
+        now = time.time()
+        rows = [
+            (model_id, input_type, text, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in vectors.items()
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+                self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE (model_id, input_type, text) IN ("
+                "SELECT model_id, input_type, text FROM embeddings ORDER BY last_used LIMIT ?)",
+                (overflow,)
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_shared_cache: Optional[EmbeddingCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Process-wide cache configured by EMBEDDING_CACHE_PATH and
+    EMBEDDING_CACHE_MAX_ENTRIES. Set EMBEDDING_CACHE_PATH to an empty string
+    to disable it.
+    """
+    global _shared_cache
+    path = os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH)
+    if not path:
+        return None
+
+    with _shared_cache_lock:
+        if _shared_cache is None or _shared_cache.path != path:
+            max_entries = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+            try:
+                _shared_cache = EmbeddingCache(path, max_entries=max_entries)
+            except sqlite3.Error as e:
+                logger.error("Embedding cache unavailable at %s: %s", path, e)
+                return None
+        return _shared_cache
@@ -1,5 +1,6 @@
-from typing import Dict, Any
+from typing import Any, Dict, Iterable, List, Set, Tuple
 import json
+from app.canonical import CanonicalProject
 
 
 def load_field_mapping(path: str) -> Dict[str, Any]:
@@ -41,38 +42,145 @@ def set_nested_value(target: Dict, path: str, value: Any):
     current[keys[-1]] = value
 
 
+class FieldMappingPlan:
+    """
+    field_mapping.json compiled once per pipeline. Paths are pre-split into
+    key tuples and every source is keyed by its top-level block, so a request
+    looks each block of the raw input up once and walks only the remainder.
+    """
+    __slots__ = ("blocks", "fields")
+
+    def __init__(self):
+        self.blocks: Tuple[str, ...] = ()
+        # (field_name, parent keys of canonical_path, leaf key, ((block index, remaining keys), ...))
+        self.fields: List[Tuple[str, Tuple[str, ...], str, Tuple[Tuple[int, Tuple[str, ...]], ...]]] = []
+
+
+def compile_field_mapping(field_mapping: Dict) -> FieldMappingPlan:
+    plan = FieldMappingPlan()
+    blocks: Dict[str, int] = {}
+
+    for field_name, config in field_mapping.items():
+        sources = []
+        for source_path in config["sources"]:
+            top, *rest = source_path.split(".")
+            sources.append((blocks.setdefault(top, len(blocks)), tuple(rest)))
+        *parents, leaf = config["canonical_path"].split(".")
+        plan.fields.append((field_name, tuple(parents), leaf, tuple(sources)))
+
+    plan.blocks = tuple(blocks)
+    return plan
+
+
+class FieldProjection:
+    """
+    The field_mapping.json entries each (sector, activity) needs. `base`
+    entries (project identity, override inputs) are always mapped; the
+    activity's own entries follow once sector and activity are known. An
+    activity without an entry maps everything else, since the similarity
+    fallback may still resolve it to any activity.
+    """
+    __slots__ = ("base", "rest", "activities")
+
+    def __init__(self):
+        self.base: Tuple[Tuple, ...] = ()
+        self.rest: Tuple[Tuple, ...] = ()
+        # (sector, normalized activity) -> entries beyond `base`
+        self.activities: Dict[Tuple[str, str], Tuple[Tuple, ...]] = {}
+
+    def entries(self, canonical: CanonicalProject) -> Tuple[Tuple, ...]:
+        identity = canonical.project_identity
+        sector, activity = identity.get("sector"), identity.get("activity")
+        if not isinstance(sector, str) or not isinstance(activity, str):
+            return self.rest
+        return self.activities.get((sector.lower(), activity.strip().lower()), self.rest)
+
+
+def compile_field_projection(
+    plan: FieldMappingPlan,
+    always_paths: Iterable[str],
+    activity_needs: Dict[Tuple[str, str], Set[str]]
+) -> FieldProjection:
+    """
+    `always_paths` are canonical paths read before the activity is known
+    (overrides); `activity_needs` maps (sector, normalized activity) to the
+    field names its rules and mandatory fields read. An entry is needed when
+    its field name or canonical leaf is one of those names.
+    """
+    projection = FieldProjection()
+    always = tuple(always_paths)
+
+    def canonical_path(entry):
+        return ".".join(entry[1] + (entry[2],))
+
+    def overlaps(path, other):
+        return path == other or path.startswith(other + ".") or other.startswith(path + ".")
+
+    base_paths = {
+        canonical_path(entry) for entry in plan.fields
+        if entry[1][:1] == ("project_identity",) or any(overlaps(canonical_path(entry), path) for path in always)
+    }
+    # Entries writing the same canonical path stay together, so the last one still wins
+    projection.base = tuple(entry for entry in plan.fields if canonical_path(entry) in base_paths)
+    projection.rest = tuple(entry for entry in plan.fields if canonical_path(entry) not in base_paths)
+
+    for key, names in activity_needs.items():
+        paths = {canonical_path(entry) for entry in projection.rest if entry[0] in names or entry[2] in names}
+        projection.activities[key] = tuple(entry for entry in projection.rest if canonical_path(entry) in paths)
+    return projection
+
+
 def map_fields_to_canonical(
     raw_input: Dict,
-    field_mapping: Dict
-):
-    canonical = {
-        "project_identity": {},
-        "validation_status": {
-            "missing_mandatory_fields": [],
-            "is_valid_for_classification": True
-        }
+    field_mapping,
+    projection: FieldProjection = None
+) -> CanonicalProject:
+    """
+    Build the canonical project from a raw payload. Accepts a FieldMappingPlan
+    or the raw field_mapping.json dict (compiled on the fly). With a
+    `projection` only the fields the project's activity needs are mapped.
+    """
+    plan = field_mapping if isinstance(field_mapping, FieldMappingPlan) else compile_field_mapping(field_mapping)
+    missing: List[str] = []
+    canonical = CanonicalProject()
+    canonical.validation_status = {
+        "missing_mandatory_fields": missing,
+        "is_valid_for_classification": True
     }
 
-    for field_name, config in field_mapping.items():
-        found = False
+    blocks = [raw_input.get(key) for key in plan.blocks] if isinstance(raw_input, dict) else [None] * len(plan.blocks)
+
+    if projection is None:
+        _map_entries(plan.fields, blocks, canonical, missing)
+    else:
+        _map_entries(projection.base, blocks, canonical, missing)
+        _map_entries(projection.entries(canonical), blocks, canonical, missing)
+
+    if missing:
+        canonical.validation_status["is_valid_for_classification"] = False
 
-        for source_path in config["sources"]:
-            value = get_nested_value(raw_input, source_path)
-            if value is not None:
-                set_nested_value(
-                    canonical,
-                    config["canonical_path"],
-                    value
-                )
-                found = True
-                break
-
-        if not found:
-            canonical["validation_status"]["missing_mandatory_fields"].append(field_name)
-
-    if canonical["validation_status"]["missing_mandatory_fields"]:
-        canonical["validation_status"]["is_valid_for_classification"] = False
-        
-    
-    print("Mapped canonical dict:", json.dumps(canonical, indent=2))  # Add this before return
     return canonical
+
+
+def _map_entries(entries, blocks: List, canonical: CanonicalProject, missing: List[str]):
+    for field_name, parents, leaf, sources in entries:
+        for block, rest in sources:
+            value = blocks[block]
+            for key in rest:
+                if not isinstance(value, dict) or key not in value:
+                    value = None
+                    break
+                value = value[key]
+            if value in ("", None):
+                continue
+
+            if parents:
+                target = canonical.section(parents[0])
+                for key in parents[1:]:
+                    target = target.setdefault(key, {})
+            else:
+                target = canonical.extra
+            target[leaf] = value
+            break
+        else:
+            missing.append(field_name)
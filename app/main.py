@@ -1,10 +1,14 @@
-from fastapi import FastAPI, Query, UploadFile, File, HTTPException
-from fastapi.responses import RedirectResponse
-from app.pipeline import ClassificationPipeline
+from fastapi import FastAPI, Query, Request, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, RedirectResponse, StreamingResponse
+from app.metrics import CONTENT_TYPE, REGISTRY
+from app.rule_store import RuleStore, start_config_watcher
+from app.rule_sync import shared_generation, start_rule_sync, worker_statuses
 from pathlib import Path
+from typing import List
 import shutil
-import subprocess
 import json
+import os
 from datetime import datetime
 
 app = FastAPI(
@@ -12,7 +16,18 @@ app = FastAPI(
     version="1.0"
 )
 
-pipeline = ClassificationPipeline(config_dir="app/config")
+# Live rules snapshot; handlers read rule_store.pipeline once per request
+rule_store = RuleStore(config_dir="app/config")
+config_watcher = None
+rule_sync = None
+
+REGISTRY.gauge("dss_rules_snapshot_version", "Version of the rules snapshot this worker serves", lambda: rule_store.version)
+REGISTRY.gauge(
+    "dss_rules_loaded_timestamp_seconds",
+    "Unix time the current rules snapshot was published",
+    lambda: rule_store.loaded_at.timestamp() if rule_store.loaded_at else None
+)
+REGISTRY.gauge("dss_rules_generation", "Shared rules generation last seen by this worker", lambda: rule_sync.generation if rule_sync else None)
 
 
 # Redirect root URL to Swagger UI
@@ -21,9 +36,117 @@ def root():
     return RedirectResponse(url="/docs")
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus metrics of this worker process."""
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
 @app.post("/classify")
-def classify_project(payload: dict, debug: bool = Query(False)):
-    return pipeline.run(payload, debug)
+async def classify_project(payload: dict, debug: bool = Query(False)):
+    return await rule_store.pipeline.arun(payload, debug)
+
+
+@app.post("/classify/batch")
+def classify_projects_batch(payloads: List[dict], debug: bool = Query(False)):
+    """
+    Classify a list of project payloads in one request.
+
+    Results are returned in input order. A record that fails returns
+    `{"status": "ERROR", "error": ...}` without affecting the rest.
+    """
+    return {
+        "count": len(payloads),
+        "results": rule_store.pipeline.run_batch(payloads, debug)
+    }
+
+
+@app.post("/classify/stream")
+async def classify_projects_stream(request: Request, debug: bool = Query(False)):
+    """
+    Classify newline-delimited JSON (one project payload per line).
+
+    The request body is consumed chunk by chunk and one result line is
+    written back per input line, so arbitrarily large extracts are processed
+    with flat memory. Each output line carries the 1-based input `line`.
+
+    **Example Usage:**
+    ```bash
+    curl -X POST "http://localhost:8000/classify/stream" \
+      -H "Content-Type: application/x-ndjson" \
+      --data-binary @projects.jsonl
+    ```
+    """
+    return _DuplexStreamingResponse(
+        _classify_ndjson(request.stream(), rule_store.pipeline, debug),
+        media_type="application/x-ndjson"
+    )
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body iterator is still reading the request body.
+    The stock response listens for disconnects on `receive`, which would
+    swallow the remaining request chunks; here request.stream() owns `receive`
+    and raises ClientDisconnect itself.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def _classify_ndjson(chunks, snapshot, debug):
+    line_no = 0
+    async for lines in _iter_ndjson_lines(chunks):
+        numbered = []
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                numbered.append((line_no, line))
+        if not numbered:
+            continue
+
+        results = await run_in_threadpool(_classify_lines, snapshot, [line for _, line in numbered], debug)
+        yield "".join(
+            json.dumps({"line": number, **result}, default=str) + "\n"
+            for (number, _), result in zip(numbered, results)
+        )
+
+
+async def _iter_ndjson_lines(chunks):
+    """
+    Yield the complete lines contained in each received body chunk. Only
+    the new chunk is searched for newlines; the pieces of an unfinished
+    line are kept in a list and joined once its newline arrives.
+    """
+    pending = []
+    async for chunk in chunks:
+        if b"\n" not in chunk:
+            pending.append(chunk)
+            continue
+        first, *lines, rest = chunk.split(b"\n")
+        pending.append(first)
+        yield [b"".join(pending)] + lines
+        pending = [rest]
+    tail = b"".join(pending)
+    if tail.strip():
+        yield [tail]
+
+
+def _classify_lines(snapshot, lines, debug):
+    payloads = []
+    errors = {}
+    for idx, line in enumerate(lines):
+        try:
+            payloads.append(json.loads(line))
+        except ValueError as e:
+            payloads.append(None)
+            errors[idx] = {"status": "ERROR", "error": f"Invalid JSON: {e}"}
+
+    results = snapshot.run_batch(payloads, debug)
+    return [errors.get(idx, result) for idx, result in enumerate(results)]
 
 
 # ============================================================================
@@ -83,40 +206,9 @@ async def refresh_rules_from_excel(
             shutil.copy(json_output, backup_path)
             print(f"Backup created: {backup_path}")
         
-        # Run converter
-        converter_script = Path("excel_to_json_converter.py")
-        
-        if not converter_script.exists():
-            raise HTTPException(
-                status_code=500,
-                detail="Converter script not found. Please ensure excel_to_json_converter.py is in the project root."
-            )
-        
-        result = subprocess.run(
-            [
-                "python",
-                str(converter_script),
-                "--excel", str(excel_path),
-                "--output", str(json_output)
-            ],
-            capture_output=True,
-            text=True,
-            cwd="."
-        )
-        
-        if result.returncode != 0:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Conversion failed: {result.stderr}"
-            )
-        
-        # Load and verify new rules
-        with open(json_output) as f:
-            new_rules = json.load(f)
-        
-        # Reload pipeline configuration
-        global pipeline
-        pipeline = ClassificationPipeline(config_dir="app/config")
+        # Convert in-process on a worker thread; the new rules are validated,
+        # compiled and written before the live snapshot is swapped
+        new_rules, converter_output, conversion_report = await run_in_threadpool(rule_store.convert_excel, excel_path, False)
         
         # Generate summary
         summary = {
@@ -133,17 +225,15 @@ async def refresh_rules_from_excel(
             },
             "backup_created": backup_path.exists() and not force,
             "backup_file": backup_path.name if backup_path.exists() else None,
-            "converter_output": result.stdout
+            "converter_output": converter_output,
+            "conversion_report": conversion_report
         }
         
         return summary
         
     except Exception as e:
-        # Restore from backup if something went wrong
-        if backup_path.exists() and json_output.exists():
-            shutil.copy(backup_path, json_output)
-            print(f"Error occurred, restored from backup")
-        
+        # Nothing to restore: convert_excel only writes dss_rules.json once the
+        # new rules have validated and compiled
         raise HTTPException(
             status_code=500,
             detail=f"Error during rule refresh: {str(e)}"
@@ -203,41 +293,9 @@ async def merge_rules_from_excel(
             shutil.copy(json_output, backup_path)
             print(f"Backup created: {backup_path}")
         
-        # Run converter with --merge flag
-        converter_script = Path("excel_to_json_converter.py")
-        
-        if not converter_script.exists():
-            raise HTTPException(
-                status_code=500,
-                detail="Converter script not found. Please ensure excel_to_json_converter.py is in the project root."
-            )
-        
-        result = subprocess.run(
-            [
-                "python",
-                str(converter_script),
-                "--excel", str(excel_path),
-                "--output", str(json_output),
-                "--merge"  # This is the key addition!
-            ],
-            capture_output=True,
-            text=True,
-            cwd="."
-        )
-        
-        if result.returncode != 0:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Merge failed: {result.stderr}"
-            )
-        
-        # Load and verify merged rules
-        with open(json_output) as f:
-            merged_rules = json.load(f)
-        
-        # Reload pipeline configuration
-        global pipeline
-        pipeline = ClassificationPipeline(config_dir="app/config")
+        # Convert and merge in-process on a worker thread; the merged rules are
+        # validated, compiled and written before the live snapshot is swapped
+        merged_rules, converter_output, conversion_report = await run_in_threadpool(rule_store.convert_excel, excel_path, True)
         
         # Generate summary
         summary = {
@@ -255,17 +313,15 @@ async def merge_rules_from_excel(
             },
             "backup_created": backup_path.exists() and not force,
             "backup_file": backup_path.name if backup_path.exists() else None,
-            "converter_output": result.stdout
+            "converter_output": converter_output,
+            "conversion_report": conversion_report
         }
         
         return summary
         
     except Exception as e:
-        # Restore from backup if something went wrong
-        if backup_path.exists() and json_output.exists():
-            shutil.copy(backup_path, json_output)
-            print(f"Error occurred, restored from backup")
-        
+        # Nothing to restore: convert_excel only writes dss_rules.json once the
+        # new rules have validated and compiled
         raise HTTPException(
             status_code=500,
             detail=f"Error during rule merge: {str(e)}"
@@ -328,7 +384,15 @@ def get_rules_status():
                 for sector, activities in rules.items()
             },
             "total_backups": len(backups),
-            "recent_backups": backup_info
+            "recent_backups": backup_info,
+            "generation": shared_generation("app/config"),
+            "worker": {
+                "pid": os.getpid(),
+                "version": rule_store.version,
+                "generation": rule_sync.generation if rule_sync else None,
+                "loaded_at": rule_store.loaded_at.isoformat() if rule_store.loaded_at else None
+            },
+            "workers": worker_statuses("app/config")
         }
     except json.JSONDecodeError:
         return {
@@ -392,12 +456,8 @@ def rollback_to_backup(backup_filename: str = None):
             shutil.copy(json_path, pre_rollback_backup)
             print(f"Pre-rollback backup created: {pre_rollback_backup}")
         
-        # Restore from backup
-        shutil.copy(backup_path, json_path)
-        
-        # Reload pipeline
-        global pipeline
-        pipeline = ClassificationPipeline(config_dir="app/config")
+        # Restore from backup (validated and compiled before it goes live)
+        rule_store.restore(backup_path)
         
         return {
             "status": "success",
@@ -503,11 +563,31 @@ def cleanup_old_backups(keep_last: int = 10):
     }
 
 
+@app.on_event("startup")
+def start_watching_config():
+    global config_watcher, rule_sync
+    rule_sync = start_rule_sync(rule_store)
+    config_watcher = start_config_watcher(rule_store)
+    if config_watcher:
+        print(f"Watching app/config every {config_watcher.interval}s for rule changes")
+
+
+@app.on_event("shutdown")
+def stop_watching_config():
+    if config_watcher:
+        config_watcher.stop()
+    if rule_sync:
+        rule_sync.stop()
+
+
 # Startup event - show URLs
 @app.on_event("startup")
 def show_docs_url():
     print("Parivesh DSS API is running")
     print("Swagger UI available at: http://127.0.0.1:8000/docs")
+    print("   - POST /classify/batch            - Classify a list of projects in one call")
+    print("   - POST /classify/stream           - Classify NDJSON, one result line per input line")
+    print("   - GET  /metrics                   - Prometheus metrics (stage latency, results, cache, Bedrock)")
     print("\nAdmin Endpoints:")
     print("   - POST /admin/refresh-rules        - Upload new rules Excel (REPLACES all)")
     print("   - POST /admin/merge-rules          - Upload new rules Excel (MERGES with existing)")
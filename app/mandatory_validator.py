@@ -1,9 +1,9 @@
-from typing import Dict, List
+from typing import Dict, List, Set, Tuple
 import json
 import logging
+from app.canonical import CanonicalProject
 
 logger = logging.getLogger("mandatory_validator")
-logger.setLevel(logging.DEBUG)
 
 def load_mandatory_rules(path: str) -> Dict:
     with open(path, "r") as f:
@@ -14,55 +14,62 @@ def normalize(text: str) -> str:
     return text.strip().lower()
 
 
-def validate_mandatory_fields(
-    canonical: Dict,
-    mandatory_rules: Dict
-):
-    logger.debug("Full canonical dict: %s", json.dumps(canonical, indent=2))  # Add this line right after the function starts
-    missing_fields: List[str] = []
+class MandatoryPlan:
+    """
+    mandatory_fields.json compiled once per pipeline: the required fields for
+    every (sector, normalized activity), deduplicated and in rule order.
+    """
+    __slots__ = ("global_fields", "sector_fields", "activity_fields")
 
-    identity = canonical.get("project_identity", {})
-    sector = normalize(identity.get("sector", ""))
-    activity = normalize(identity.get("activity", ""))
+    def __init__(self):
+        self.global_fields: Tuple[str, ...] = ()
+        self.sector_fields: Dict[str, Tuple[str, ...]] = {}
+        self.activity_fields: Dict[Tuple[str, str], Tuple[str, ...]] = {}
 
-    logger.debug("Validator | sector=%s activity=%s", sector, activity)
-    logger.debug("Validator | canonical keys=%s", list(canonical.keys()))
+    def required(self, sector: str, activity: str) -> Tuple[str, ...]:
+        fields = self.activity_fields.get((sector, activity))
+        if fields is None:
+            fields = self.sector_fields.get(sector, self.global_fields)
+        return fields
 
+
+def compile_mandatory_rules(mandatory_rules: Dict) -> MandatoryPlan:
+    plan = MandatoryPlan()
     # 1️⃣ Global mandatory fields
-    for field in mandatory_rules.get("global", []):
-        if not _field_present(canonical, field):
-            logger.debug("Missing global field: %s", field)
-            missing_fields.append(field)
-
-    # 2️⃣ Sector-level common fields
-    sector_rules = mandatory_rules.get("sector", {}).get(sector, {})
-    for field in sector_rules.get("common", []):
-        if not _field_present(canonical, field):
-            logger.debug("Missing sector-level common field: %s", field)
-            missing_fields.append(field)
-
-    # 3️⃣ Activity-level fields
-    activity_rules = sector_rules.get("activities", {})
-    matched_activity = None
-    for activity_key in activity_rules.keys():
-        if normalize(activity_key) == activity:
-            matched_activity = activity_key
-            break
-
-    if matched_activity:
-        required_fields = activity_rules.get(matched_activity, [])
-        logger.debug("Validator | required_fields for activity '%s': %s", matched_activity, required_fields)
-
-        for field in required_fields:
-            if not _field_present(canonical, field):
-                logger.debug("Missing activity-level field: %s", field)
-                missing_fields.append(field)
-
-    # 🔹 Deduplicate
-    missing_fields = list(set(missing_fields))
-    logger.debug("Final missing_fields: %s", missing_fields)
+    plan.global_fields = _unique(mandatory_rules.get("global", []))
+
+    for sector, sector_rules in mandatory_rules.get("sector", {}).items():
+        # 2️⃣ Sector-level common fields
+        common = plan.global_fields + tuple(sector_rules.get("common", []))
+        plan.sector_fields[sector] = _unique(common)
+
+        # 3️⃣ Activity-level fields (first key wins when two normalize alike)
+        for activity_key, fields in sector_rules.get("activities", {}).items():
+            key = (sector, normalize(activity_key))
+            if key not in plan.activity_fields:
+                plan.activity_fields[key] = _unique(common + tuple(fields or []))
+    return plan
+
 
+def validate_mandatory_fields(
+    canonical: CanonicalProject,
+    mandatory_rules
+):
+    """
+    Accepts a MandatoryPlan or the raw mandatory_fields.json dict (compiled on
+    the fly). A field counts as present when any key of that name anywhere in
+    the canonical project holds a non-empty value.
+    """
+    plan = mandatory_rules if isinstance(mandatory_rules, MandatoryPlan) else compile_mandatory_rules(mandatory_rules)
+
+    identity = canonical.project_identity
+    sector = normalize(identity.get("sector", ""))
+    activity = normalize(identity.get("activity", ""))
+
+    present = _present_keys(canonical)
+    missing_fields: List[str] = [field for field in plan.required(sector, activity) if field not in present]
     if missing_fields:
+        logger.debug("Validator | sector=%s activity=%s missing=%s", sector, activity, missing_fields)
         return {
             "status": "UNDETERMINED",
             "reason": "Missing mandatory fields",
@@ -75,31 +82,22 @@ def validate_mandatory_fields(
     }
 
 
-def _field_present(canonical: Dict, field_name: str) -> bool:
-    # Check top-level first
-    if field_name in canonical and canonical[field_name] not in ("", None):
-        return True
-    # Check derived_parameters
-    derived = canonical.get("derived_parameters", {})
-    if field_name in derived and derived[field_name] not in ("", None):
-        return True
-    
-    def recursive_search(obj):
+def _present_keys(canonical: CanonicalProject) -> Set[str]:
+    """Single pass over the canonical project collecting every key with a non-empty value."""
+    present: Set[str] = set()
+    stack = [dict(canonical.items())]
+    while stack:
+        obj = stack.pop()
         if isinstance(obj, dict):
             for k, v in obj.items():
-                if k == field_name:
-                    print(f"DEBUG: Found field '{field_name}' with value: {v}")  # Temp
-                    if v not in ("", None):
-                        return True
-                if recursive_search(v):
-                    return True
+                if v not in ("", None):
+                    present.add(k)
+                    if isinstance(v, (dict, list)):
+                        stack.append(v)
         elif isinstance(obj, list):
-            for item in obj:
-                if recursive_search(item):
-                    return True
-        return False
-    
-    result = recursive_search(canonical)
-    if not result:
-        print(f"DEBUG: Field '{field_name}' NOT found in canonical")  # Temp
-    return result
\ No newline at end of file
+            stack.extend(item for item in obj if isinstance(item, (dict, list)))
+    return present
+
+
+def _unique(fields) -> Tuple[str, ...]:
+    return tuple(dict.fromkeys(fields))
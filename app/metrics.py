@@ -0,0 +1,263 @@
+"""
+In-process metrics in the Prometheus text format, served on /metrics.
+
+Counters are dicts updated under a per-metric lock. Histograms buffer raw
+samples and bucket them in bulk, so recording a stage time is a list append.
+Gauges are read from a callback at scrape time. Every uvicorn worker keeps
+its own registry.
+"""
+
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+import os
+import threading
+import time
+
+# Seconds; spans in-memory stages (sub-millisecond) up to Bedrock calls
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# In-memory pipeline stages take microseconds
+STAGE_BUCKETS = (0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# Buffered histogram samples per series before they are folded into buckets
+FOLD_EVERY = 4096
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Histogram:
+    """
+    observe() only appends the value to a per-series list (atomic under the
+    GIL, no lock). The buffered values are folded into bucket counts with
+    numpy every FOLD_EVERY samples and at scrape time.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._bounds = np.asarray(self.buckets, dtype=float)
+        # labels -> values observed since the last fold
+        self._pending: Dict[Tuple[str, ...], List[float]] = {}
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        pending = self._pending.get(labels)
+        if pending is None:
+            pending = self._add_series(labels)
+        pending.append(value)
+        if len(pending) >= FOLD_EVERY:
+            self._fold(labels, pending)
+
+    def _add_series(self, labels: Tuple[str, ...]) -> List[float]:
+        with self._lock:
+            if labels not in self._pending:
+                self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+                self._pending[labels] = []
+            return self._pending[labels]
+
+    def _fold(self, labels: Tuple[str, ...], pending: List[float]):
+        with self._lock:
+            taken = len(pending)
+            if not taken:
+                return
+            values = np.fromiter(pending[:taken], dtype=float, count=taken)
+            # Values appended meanwhile sit past `taken` and stay for the next fold
+            del pending[:taken]
+            counts = np.bincount(np.searchsorted(self._bounds, values, side="left"), minlength=len(self.buckets) + 1)
+            series = self._series[labels]
+            for idx, count in enumerate(counts.tolist()):
+                series[idx] += count
+            series[-1] += float(values.sum())
+
+    def samples(self):
+        for labels, pending in list(self._pending.items()):
+            self._fold(labels, pending)
+        with self._lock:
+            series = [(labels, list(values)) for labels, values in self._series.items()]
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield self.name + "_bucket", _labels(self.labelnames + ("le",), labels + (le,)), cumulative
+            yield self.name + "_sum", _labels(self.labelnames, labels), values[-1]
+            yield self.name + "_count", _labels(self.labelnames, labels), cumulative
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], Optional[float]]):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def samples(self):
+        try:
+            value = self.read()
+        except Exception:
+            value = None
+        if value is not None:
+            yield self.name, "", value
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], Optional[float]]) -> Gauge:
+        return self.register(Gauge(name, documentation, read))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    if isinstance(value, int) or (isinstance(value, float) and value.is_integer() and abs(value) < 1e15):
+        return str(int(value))
+    return repr(float(value))
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "dss_stage_duration_seconds",
+    "Time spent in each classification pipeline stage",
+    ("stage",),
+    STAGE_BUCKETS
+)
+PIPELINE_SECONDS = REGISTRY.histogram(
+    "dss_pipeline_duration_seconds",
+    "End-to-end pipeline time per classification call",
+    ("entrypoint",)
+)
+CLASSIFICATIONS = REGISTRY.counter(
+    "dss_classifications_total",
+    "Classification results by status, decision mode and category",
+    ("status", "decision_mode", "category")
+)
+SIMILARITY_CACHE = REGISTRY.counter(
+    "dss_similarity_cache_total",
+    "Semantic activity match cache lookups",
+    ("result",)
+)
+RESULT_CACHE = REGISTRY.counter(
+    "dss_result_cache_total",
+    "Classification response cache lookups",
+    ("result",)
+)
+BEDROCK_SECONDS = REGISTRY.histogram(
+    "dss_bedrock_call_duration_seconds",
+    "Bedrock model call latency, including queueing for a call slot",
+    ("operation", "outcome")
+)
+
+
+class StageClock:
+    """Times consecutive pipeline stages: each lap() observes the time since the previous lap or mark()."""
+    __slots__ = ("started", "last")
+
+    def __init__(self):
+        self.started = self.last = time.perf_counter()
+
+    def mark(self):
+        """Start timing the next stage from now, skipping work that is not a stage."""
+        self.last = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        STAGE_SECONDS.observe(now - self.last, stage)
+        self.last = now
+
+    def finish(self, entrypoint: str):
+        PIPELINE_SECONDS.observe(time.perf_counter() - self.started, entrypoint)
+
+
+class NullClock:
+    """Stand-in when stage timing is off."""
+    __slots__ = ()
+
+    def mark(self):
+        pass
+
+    def lap(self, stage: str):
+        pass
+
+    def finish(self, entrypoint: str):
+        pass
+
+
+NULL_CLOCK = NullClock()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+
+
+def start_clock(debug: bool = False):
+    """
+    Stage timing for one classification. Debug requests are not timed: the
+    trace snapshots they take would skew the stage histograms.
+    """
+    return StageClock() if METRICS_ENABLED and not debug else NULL_CLOCK
+
+
+def record_result(response: Dict):
+    if METRICS_ENABLED:
+        CLASSIFICATIONS.inc(
+            response.get("status", ""),
+            response.get("decision_mode", ""),
+            response.get("category") or ""
+        )
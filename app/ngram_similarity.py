@@ -0,0 +1,64 @@
+from typing import Dict, List, Tuple
+from collections import Counter
+from app.embedding_cache import normalize_text
+import math
+
+NGRAM_RANGE = (2, 3)
+NGRAM_SIMILARITY_THRESHOLD = 0.5
+
+
+def char_ngrams(text: str, ngram_range: Tuple[int, int] = NGRAM_RANGE) -> Counter:
+    padded = " {0} ".format(normalize_text(text))
+    grams = Counter()
+    low, high = ngram_range
+    for n in range(low, high + 1):
+        for i in range(len(padded) - n + 1):
+            grams[padded[i:i + n]] += 1
+    return grams
+
+
+class NgramSimilarityEngine:
+    """
+    Offline activity matcher: cosine similarity over character n-gram TF-IDF
+    vectors, scored through an inverted index. No network access, so it
+    works air-gapped and answers in microseconds.
+    """
+    threshold = NGRAM_SIMILARITY_THRESHOLD
+
+    def __init__(self, activity_keys, ngram_range: Tuple[int, int] = NGRAM_RANGE):
+        self.activity_keys = list(activity_keys)
+        self.ngram_range = ngram_range
+
+        doc_grams = [char_ngrams(key, ngram_range) for key in self.activity_keys]
+        doc_freq = Counter(gram for grams in doc_grams for gram in grams)
+        total = len(self.activity_keys)
+        self.idf: Dict[str, float] = {
+            gram: math.log((1 + total) / (1 + df)) + 1.0 for gram, df in doc_freq.items()
+        }
+        # Grams never seen in the vocabulary still count towards the query norm
+        self.unseen_idf = math.log(1 + total) + 1.0
+
+        self.postings: Dict[str, List[Tuple[int, float]]] = {}
+        for doc, grams in enumerate(doc_grams):
+            weights = {gram: count * self.idf[gram] for gram, count in grams.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for gram, weight in weights.items():
+                self.postings.setdefault(gram, []).append((doc, weight / norm))
+
+    def find_closest(self, query: str) -> Tuple[str, float]:
+        if not self.activity_keys:
+            return "", 0.0
+
+        grams = char_ngrams(query, self.ngram_range)
+        weights = {gram: count * self.idf.get(gram, self.unseen_idf) for gram, count in grams.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        if not norm:
+            return self.activity_keys[0], 0.0
+
+        scores = [0.0] * len(self.activity_keys)
+        for gram, weight in weights.items():
+            for doc, doc_weight in self.postings.get(gram, ()):
+                scores[doc] += weight * doc_weight
+
+        idx = max(range(len(scores)), key=scores.__getitem__)
+        return self.activity_keys[idx], scores[idx] / norm
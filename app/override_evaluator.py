@@ -1,4 +1,15 @@
-from typing import Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.canonical import CanonicalProject
+from app.rule_engine import interval_test
+from collections import deque
+import operator
+
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le
+}
 
 
 def get_nested_value(data: Dict, path: str):
@@ -14,58 +25,210 @@ def get_nested_value(data: Dict, path: str):
     return current
 
 
+# Below this many activity keywords a plain substring scan beats the automaton
+AUTOMATON_MIN_KEYWORDS = 32
+
+
+class OverridePlan:
+    """
+    override_rules.json compiled once per pipeline.
+
+    Absolute overrides become (canonical path, path reader, bound test,
+    reason) in rule order. Activity keywords are deduplicated keeping the first rule; short
+    lists are scanned with `in`, longer ones through an Aho-Corasick
+    automaton that finds every keyword in one pass over the activity.
+    """
+    __slots__ = ("absolute", "activity_keywords", "activity_automaton", "activity_reasons")
+
+    def __init__(self):
+        self.absolute: List[Tuple[str, Callable[[CanonicalProject], Any], Callable[[Any], bool], str]] = []
+        # (keyword, reason) in rule order
+        self.activity_keywords: List[Tuple[str, str]] = []
+        self.activity_automaton: Optional["KeywordAutomaton"] = None
+        self.activity_reasons: List[str] = []
+
+    def activity_override(self, activity: str) -> Optional[str]:
+        if self.activity_automaton is None:
+            for keyword, reason in self.activity_keywords:
+                if keyword in activity:
+                    return reason
+            return None
+        idx = self.activity_automaton.first_match(activity)
+        return None if idx is None else self.activity_reasons[idx]
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over keywords numbered in priority order,
+    expanded into a transition dict per state. first_match() returns the
+    lowest number of any keyword occurring in the text.
+    """
+    __slots__ = ("delta", "match")
+
+    def __init__(self, keywords: List[str]):
+        trie: List[Dict[str, int]] = [{}]
+        match: List[Optional[int]] = [None]
+        for idx, keyword in enumerate(keywords):
+            state = 0
+            for ch in keyword:
+                nxt = trie[state].get(ch)
+                if nxt is None:
+                    nxt = len(trie)
+                    trie.append({})
+                    match.append(None)
+                    trie[state][ch] = nxt
+                state = nxt
+            if match[state] is None:
+                match[state] = idx
+
+        # Breadth first, so a state's fallback is complete before it is used
+        delta: List[Dict[str, int]] = [dict() for _ in trie]
+        delta[0] = dict(trie[0])
+        queue = deque((child, 0) for child in trie[0].values())
+        while queue:
+            state, fallback = queue.popleft()
+            inherited = match[fallback]
+            if inherited is not None and (match[state] is None or inherited < match[state]):
+                match[state] = inherited
+            delta[state] = dict(delta[fallback])
+            delta[state].update(trie[state])
+            for ch, child in trie[state].items():
+                queue.append((child, delta[fallback].get(ch, 0)))
+        self.delta = delta
+        self.match = match
+
+    def first_match(self, text: str) -> Optional[int]:
+        delta, match = self.delta, self.match
+        best = None
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            found = match[state]
+            if found is not None and (best is None or found < best):
+                if found == 0:
+                    return 0
+                best = found
+        return best
+
+
+def compile_override_rules(override_rules: Dict) -> OverridePlan:
+    plan = OverridePlan()
+    for rule in override_rules.get("absolute_overrides", []):
+        if "trigger_value" in rule:
+            test = _equals(rule["trigger_value"])
+        elif "trigger_condition" in rule:
+            test = _present_and(_compile_condition(rule["trigger_condition"]))
+        else:
+            continue
+        plan.absolute.append((rule["canonical_path"], _path_reader(rule["canonical_path"]), test, rule["reason"]))
+
+    seen = set()
+    for rule in override_rules.get("activity_overrides", []):
+        keyword = rule["activity_contains"]
+        if keyword in seen:
+            continue
+        seen.add(keyword)
+        plan.activity_keywords.append((keyword, rule["reason"]))
+        if not keyword:
+            # Empty keyword matches every activity; later rules are unreachable
+            break
+
+    if len(plan.activity_keywords) >= AUTOMATON_MIN_KEYWORDS and plan.activity_keywords[-1][0]:
+        plan.activity_automaton = KeywordAutomaton([keyword for keyword, _ in plan.activity_keywords])
+        plan.activity_reasons = [reason for _, reason in plan.activity_keywords]
+    return plan
+
+
 def evaluate_overrides(
-    canonical: Dict,
-    override_rules: Dict
+    canonical: CanonicalProject,
+    override_rules
 ) -> Optional[Dict]:
     """
-    Returns override decision if triggered, else None
+    Returns override decision if triggered, else None. Accepts an
+    OverridePlan or the raw override_rules.json dict (compiled on the fly).
     """
+    plan = override_rules if isinstance(override_rules, OverridePlan) else compile_override_rules(override_rules)
 
     # 1. Absolute overrides
-    for rule in override_rules.get("absolute_overrides", []):
-        value = get_nested_value(canonical, rule["canonical_path"])
+    for path, read, test, reason in plan.absolute:
+        value = read(canonical)
+        if test(value):
+            return _override_result(reason, {path: value})
 
-        if "trigger_value" in rule:
-            if value == rule["trigger_value"]:
-                return _override_result(rule["reason"])
+    # 2. Activity-based overrides
+    activity = canonical.project_identity.get("activity", "")
+    reason = plan.activity_override(activity.lower())
+    if reason is not None:
+        return _override_result(reason, {"project_identity.activity": activity})
 
-        elif "trigger_condition" in rule and value is not None:
-            cond = rule["trigger_condition"]
-            if _evaluate_condition(value, cond):
-                return _override_result(rule["reason"])
+    return None
 
-    # 2. Activity-based overrides
-    activity = canonical.get("project_identity", {}).get("activity", "").lower()
 
-    for rule in override_rules.get("activity_overrides", []):
-        if rule["activity_contains"] in activity:
-            return _override_result(rule["reason"])
+def _path_reader(path: str) -> Callable[[CanonicalProject], Any]:
+    """CanonicalProject.get_path with the dot path split once."""
+    first, *rest = path.split(".")
+
+    def read(canonical: CanonicalProject):
+        current = canonical.get(first)
+        for key in rest:
+            if not isinstance(current, dict):
+                return None
+            current = current.get(key)
+            if current is None:
+                return None
+        return current
+    return read
+
+
+def _equals(expected) -> Callable[[Any], bool]:
+    return lambda value: value == expected
 
-    return None
 
+def _present_and(test: Callable[[Any], bool]) -> Callable[[Any], bool]:
+    return lambda value: value is not None and test(value)
 
-def _evaluate_condition(value, condition: Dict) -> bool:
-    op = condition["operator"]
+
+def _compile_condition(condition: Dict) -> Callable[[Any], bool]:
+    """
+    {"operator": ">", "value": 20}, {"between": [lo, hi], "closed": "left"}
+    or {"all": [...]} / {"any": [...]} of those, bound into one test.
+    """
+    if "all" in condition:
+        parts = [_compile_condition(c) for c in condition["all"]]
+        return lambda value: bool(parts) and all(part(value) for part in parts)
+    if "any" in condition:
+        parts = [_compile_condition(c) for c in condition["any"]]
+        return lambda value: any(part(value) for part in parts)
+    if "between" in condition:
+        interval = interval_test(condition["between"], condition.get("closed", "left"))
+        if interval is None:
+            return _never
+
+        def between(value):
+            try:
+                return interval(float(value))
+            except (TypeError, ValueError):
+                return False
+        return between
+
+    compare = OPERATORS.get(condition.get("operator"))
+    if compare is None or "value" not in condition:
+        return _never
     threshold = condition["value"]
+    return lambda value: compare(value, threshold)
 
-    if op == ">":
-        return value > threshold
-    if op == ">=":
-        return value >= threshold
-    if op == "<":
-        return value < threshold
-    if op == "<=":
-        return value <= threshold
 
+def _never(value) -> bool:
     return False
 
 
-def _override_result(reason: str) -> Dict:
+def _override_result(reason: str, decision_fields: Dict) -> Dict:
     return {
         "override_triggered": True,
         "category": "A",
         "decision_mode": "OVERRIDE",
         "reason": reason,
-        "confidence": 1.0
+        "confidence": 1.0,
+        # Canonical path that triggered the override, with its value
+        "decision_fields": decision_fields
     }
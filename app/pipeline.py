@@ -1,9 +1,15 @@
-import json
-from app.field_mapper import map_fields_to_canonical
-from app.mandatory_validator import validate_mandatory_fields
-from app.override_evaluator import evaluate_overrides
-from app.capacity_normalizer import normalize_capacity
-from app.rule_engine import classify_by_rules
+import copy
+import itertools
+from app.config_loader import CONFIG_FILES, load_config
+from app.metrics import record_result, start_clock
+from app.field_mapper import compile_field_mapping, compile_field_projection, map_fields_to_canonical
+from app.mandatory_validator import compile_mandatory_rules, validate_mandatory_fields
+from app.override_evaluator import compile_override_rules, evaluate_overrides
+from app.capacity_normalizer import CAPACITY_INPUTS, normalize_capacity
+from app.result_cache import lookup_result, remember_result
+from app.rule_artifact import load_artifact
+from app.rule_engine import METRIC_SEMANTICS, aclassify_by_rules, classify_by_rules, classify_batch_by_rules, compile_rules
+from app.trace import start_trace
 
 CATEGORY_AUTHORITY_MAP = {
     "A": {"clearance_authority": "MoEFCC", "appraisal_body": "EAC"},
@@ -11,80 +17,244 @@ CATEGORY_AUTHORITY_MAP = {
     "B2": {"clearance_authority": "DEIAA", "appraisal_body": "DEAC"}
 }
 
+# Distinguishes pipeline snapshots (and rule versions) within a process, e.g. in result cache keys
+_snapshot_ids = itertools.count(1)
+
+# Pipeline component -> (compiled attribute, compiler); dss_rules is handled in _set_component
+COMPILERS = {
+    "field_mapping": ("field_plan", compile_field_mapping),
+    "mandatory_rules": ("mandatory_plan", compile_mandatory_rules),
+    "override_rules": ("override_plan", compile_override_rules)
+}
+
+
 class ClassificationPipeline:
 
     def __init__(self, config_dir):
-        self.field_mapping = json.load(open("{0}/field_mapping.json".format(config_dir)))
-        self.mandatory_rules = json.load(open("{0}/mandatory_fields.json".format(config_dir)))
-        self.override_rules = json.load(open("{0}/override_rules.json".format(config_dir)))
-        self.dss_rules = json.load(open("{0}/dss_rules.json".format(config_dir)))
+        """Load and compile the four config files from config_dir."""
+        self.config_dir = config_dir
+        self.snapshot_id = next(_snapshot_ids)
+        artifact = load_artifact(config_dir)
+        if artifact is not None:
+            # Precompiled artifact: no JSON parsing, band tables restored as built
+            self.loaded_from = "artifact"
+            for component in CONFIG_FILES:
+                self._set_component(component, artifact["configs"][component], artifact["tables"])
+        else:
+            self.loaded_from = "json"
+            for component in CONFIG_FILES:
+                self._set_component(component, load_config(config_dir, component))
+        self._compile_projection()
+
+    def updated(self, components):
+        """
+        Copy of this pipeline with the given {component: config} replaced and
+        recompiled; every other component is shared with this one.
+        """
+        pipeline = copy.copy(self)
+        pipeline.snapshot_id = next(_snapshot_ids)
+        # Replaced components come from parsed JSON, not from the artifact
+        pipeline.loaded_from = "json"
+        for component, config in components.items():
+            pipeline._set_component(component, config)
+        pipeline._compile_projection()
+        return pipeline
+
+    def _set_component(self, component, config, tables=None):
+        setattr(self, component, config)
+        if component == "dss_rules":
+            self.compiled_rules = compile_rules(config, tables)
+        elif component in COMPILERS:
+            attribute, compiler = COMPILERS[component]
+            setattr(self, attribute, compiler(config))
+
+    def _compile_projection(self):
+        """
+        Field projection for every (sector, activity) in the rules: the fields
+        its reachable rules and mandatory fields read, plus the capacity
+        inputs when a capacity metric is among them. Built from four config
+        files, so it is rebuilt whenever any of them changes.
+        """
+        needs = {}
+        for sector, table in self.compiled_rules.sectors.items():
+            for key, activity in table.items():
+                names = set(activity.fields)
+                names.update(self.mandatory_plan.required(sector.strip().lower(), key))
+                if names & METRIC_SEMANTICS["capacity"]:
+                    names.update(CAPACITY_INPUTS)
+                needs[(sector, key)] = names
+        override_paths = [rule["canonical_path"] for rule in self.override_rules.get("absolute_overrides", [])]
+        self.field_projection = compile_field_projection(self.field_plan, override_paths, needs)
 
     def run(self, raw_input, debug=False):
+        trace, clock = start_trace(debug), start_clock(debug)
+        canonical = self._map(raw_input, trace, clock)
+        cache_key, response = self._cached_result(canonical, trace, clock)
+        if response is None:
+            canonical, response = self._prepare(canonical, trace, clock)
+            if response is None:
+                # STEP 6: DSS Rule Engine
+                result = classify_by_rules(canonical, self.compiled_rules)
+                clock.lap("rule_engine")
+                trace.snapshot("rule_engine", result)
+                response = self._final_response(result, canonical, trace)
+            remember_result(cache_key, response)
+        clock.finish("single")
+        record_result(response)
+        return response
+
+    async def arun(self, raw_input, debug=False):
+        """
+        run() for async callers: identical steps, but a semantic similarity
+        lookup awaits the model call instead of holding a worker thread.
+        """
+        trace, clock = start_trace(debug), start_clock(debug)
+        canonical = self._map(raw_input, trace, clock)
+        cache_key, response = self._cached_result(canonical, trace, clock)
+        if response is None:
+            canonical, response = self._prepare(canonical, trace, clock)
+            if response is None:
+                # STEP 6: DSS Rule Engine
+                result = await aclassify_by_rules(canonical, self.compiled_rules)
+                clock.lap("rule_engine")
+                trace.snapshot("rule_engine", result)
+                response = self._final_response(result, canonical, trace)
+            remember_result(cache_key, response)
+        clock.finish("single")
+        record_result(response)
+        return response
+
+    def run_batch(self, raw_inputs, debug=False):
+        """
+        Classify a list of payloads in one call. Results keep input order and a
+        failing record yields an ERROR entry without affecting the others
+        (run() raises instead). Lookups go through the result cache like run().
+        """
+        responses = [None] * len(raw_inputs)
+        cache_keys = [None] * len(raw_inputs)
+        pending = []
+        clock = start_clock(debug)
+
+        for idx, raw_input in enumerate(raw_inputs):
+            trace = start_trace(debug)
+            clock.mark()
+            try:
+                canonical = self._map(raw_input, trace, clock)
+                cache_key, response = self._cached_result(canonical, trace, clock)
+                if response is None:
+                    # Remembered once the record is classified
+                    cache_keys[idx] = cache_key
+                    canonical, response = self._prepare(canonical, trace, clock)
+            except Exception as e:
+                responses[idx] = _error_response(e)
+                continue
+            if response is not None:
+                responses[idx] = response
+            else:
+                pending.append((idx, canonical, trace))
 
+        # STEP 6: DSS Rule Engine, vectorized per (sector, activity) group
+        clock.mark()
+        try:
+            results = classify_batch_by_rules([canonical for _, canonical, _ in pending], self.compiled_rules)
+        except Exception:
+            results = [None] * len(pending)
+
+        for (idx, canonical, trace), result in zip(pending, results):
+            try:
+                if result is None:
+                    result = classify_by_rules(canonical, self.compiled_rules)
+                trace.snapshot("rule_engine", result)
+                responses[idx] = self._final_response(result, canonical, trace)
+            except Exception as e:
+                responses[idx] = _error_response(e)
+        clock.lap("batch_rule_engine")
+        clock.finish("batch")
+        for cache_key, response in zip(cache_keys, responses):
+            remember_result(cache_key, response)
+            record_result(response)
+        return responses
+
+    def _map(self, raw_input, trace, clock):
         # STEP 1: Field Mapping
-        canonical = map_fields_to_canonical(raw_input, self.field_mapping)
+        canonical = map_fields_to_canonical(raw_input, self.field_plan, self.field_projection)
+        clock.lap("field_mapping")
+        trace.snapshot("field_mapping", canonical)
+        return canonical
+
+    def _cached_result(self, canonical, trace, clock):
+        """
+        (cache key, response) from the result cache (see app/result_cache.py).
+        Debug requests bypass it, since they need every stage's trace.
+        """
+        if trace.enabled:
+            return None, None
+        cache_key, response = lookup_result(self.snapshot_id, canonical)
+        if cache_key is not None:
+            clock.lap("result_cache")
+        return cache_key, response
+
+    def _prepare(self, canonical, trace, clock):
+        """
+        Steps 2-5 on the mapped project. Returns (canonical, None) when it is
+        ready for the rule engine, or (canonical, response) when an earlier
+        step decided it.
+        """
 
         # STEP 2: Override Evaluation
-        override = evaluate_overrides(canonical, self.override_rules)
+        override = evaluate_overrides(canonical, self.override_plan)
+        clock.lap("override")
         if override:
-            return self._final_response(override, canonical, debug)
+            trace.snapshot("override", override)
+            return canonical, self._final_response(override, canonical, trace)
 
         # STEP 3: Capacity Normalization (skips paper mill)
         canonical = normalize_capacity(canonical)
+        clock.lap("capacity_normalization")
+        trace.snapshot("capacity_normalization", canonical)
 
         # STEP 4: Derived Parameters
-        canonical.setdefault("derived_parameters", {})
-        
+        derived = canonical.derived_parameters
+
         # Special handling for paper mill (uses TPD not MTPA)
-        identity = canonical.get("project_identity", {})
-        activity = identity.get("activity", "").lower()
-        cap_norm = canonical.get("capacity_normalization", {})
-        
+        activity = canonical.project_identity.get("activity", "").lower()
+        cap_norm = canonical.capacity_normalization
+
         if activity == "paper mill":
             # Paper mill: map proposed_capacity directly (already in TPD)
             # Note: Field mapper already moved it to capacity_normalization
             if "proposed_capacity" in cap_norm:
-                canonical["derived_parameters"]["effective_capacity"] = cap_norm["proposed_capacity"]
+                derived["effective_capacity"] = cap_norm["proposed_capacity"]
         else:
             # Normal industry capacity mapping (MTPA)
             cap = cap_norm.get("total_effective_capacity")
             if cap:
-                canonical["derived_parameters"]["effective_capacity"] = cap["value"]
-
+                derived["effective_capacity"] = cap["value"]
 
         # Generic field mapping: Copy ALL numeric fields from form1_part_a to derived_parameters
         # This makes it future-proof for any new activities/fields
-        form1 = canonical.get("form1_part_a", {})
-        derived = canonical.get("derived_parameters", {})
-
-        for field, value in form1.items():
+        for field, value in canonical.form1_part_a.items():
             # Only copy numeric fields (int, float) to derived_parameters
             if isinstance(value, (int, float)) and field not in derived:
-                canonical["derived_parameters"][field] = float(value)
-                # Also copy to top-level for backward compatibility
-                canonical[field] = float(value)
-
+                derived[field] = float(value)
+        clock.lap("derived_parameters")
+        trace.snapshot("derived_parameters", canonical)
 
-         # Debug: show canonical just before mandatory validation
-        if debug:
-            print("DEBUG canonical BEFORE mandatory validation:")
-            print(json.dumps(canonical, indent=2))
-            
         # STEP 5: Mandatory Validation
-        validation = validate_mandatory_fields(canonical, self.mandatory_rules)
+        validation = validate_mandatory_fields(canonical, self.mandatory_plan)
+        clock.lap("mandatory_validation")
+        trace.snapshot("mandatory_validation", validation)
         if validation["status"] == "UNDETERMINED":
-            return validation
+            if trace.enabled:
+                validation = {**validation, "trace": trace.stages}
+            return canonical, validation
 
-        # DEBUG
-        if debug:
-            print("DEBUG canonical BEFORE rule engine:")
-            print(json.dumps(canonical, indent=2))
+        return canonical, None
 
-        # STEP 6: DSS Rule Engine
-        result = classify_by_rules(canonical, self.dss_rules)
-        return self._final_response(result, canonical, debug)
-
-    def _final_response(self, result, canonical, debug):
+    def _final_response(self, result, canonical, trace):
+        if result.get("status") == "UNDETERMINED":
+            # The rule engine could not read a field it needed (see rule_engine._invalid_field)
+            return {**result, "trace": trace.stages} if trace.enabled else result
         category = result.get("category")
         authority_info = CATEGORY_AUTHORITY_MAP.get(category, {})
         response = {
@@ -92,9 +262,16 @@ class ClassificationPipeline:
             **result,
             **authority_info
         }
-        derived = canonical.get("derived_parameters", {})
-        if derived.get("activity_matched_by") == "semantic_similarity":
+        if canonical.derived_parameters.get("activity_matched_by") == "semantic_similarity":
            response["confidence"] = min(response.get("confidence", 1.0), 0.85)
-        if debug:
-            response["canonical_project"] = canonical
+        if trace.enabled:
+            response["canonical_project"] = canonical.to_dict()
+            response["trace"] = trace.stages
         return response
+
+
+def _error_response(error):
+    return {
+        "status": "ERROR",
+        "error": str(error)
+    }
@@ -0,0 +1,61 @@
+"""
+Opt-in cache of complete classification responses for repeated submissions
+of the same project (e.g. a portal re-posting a form while it is edited).
+
+Keyed by the pipeline snapshot and a hash of the canonical project as built
+by field mapping, so unmapped payload keys do not split entries and a rules
+reload or rollback never serves a response computed on other rules.
+Disabled unless RESULT_CACHE_SIZE is above 0.
+"""
+
+from typing import Dict, Hashable, Optional, Tuple
+import hashlib
+import json
+import os
+
+from app.canonical import CanonicalProject
+from app.metrics import RESULT_CACHE
+from app.ttl_cache import TTLCache
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "0") or 0)
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300") or 0)
+
+# (snapshot id, canonical fingerprint) -> response
+_results = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+
+
+def canonical_fingerprint(canonical: CanonicalProject) -> str:
+    """
+    Stable hash of a canonical project; key order does not matter.
+    validation_status is left out: it only lists the mapped fields that are
+    absent, which the other sections already show.
+    """
+    project = {name: value for name, value in canonical.items() if name != "validation_status"}
+    payload = json.dumps(project, sort_keys=True, separators=(",", ":"), default=repr)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def lookup_result(snapshot_id: int, canonical: CanonicalProject) -> Tuple[Optional[Hashable], Optional[Dict]]:
+    """
+    (key, cached response or None). The key is None when caching is off, in
+    which case remember_result() is a no-op.
+    """
+    if RESULT_CACHE_SIZE <= 0:
+        return None, None
+    key = (snapshot_id, canonical_fingerprint(canonical))
+    response = _results.get(key)
+    RESULT_CACHE.inc("miss" if response is None else "hit")
+    return key, None if response is None else dict(response)
+
+
+def remember_result(key: Optional[Hashable], response: Dict):
+    # A fallback may stand for a failed similarity lookup; don't pin that
+    if key is None or response.get("decision_mode") == "DEFAULT_FALLBACK":
+        return
+    if response.get("status") in ("CLASSIFIED", "UNDETERMINED"):
+        _results.set(key, dict(response))
+
+
+def reset_result_cache():
+    """Drop every cached response; called when a new rules snapshot is published."""
+    _results.clear()
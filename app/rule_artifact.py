@@ -0,0 +1,215 @@
+"""
+Precompiled rules artifact (app/config/rules.bin).
+
+Layout: a fixed header followed by the payload. All integers are
+little-endian; `str` is a uint16 byte length followed by UTF-8 text.
+
+    magic       8 bytes   b"DSSRULE1"
+    format      uint16    ARTIFACT_FORMAT
+    compiler    uint16    rule_engine.RULES_COMPILER_VERSION of the builder
+    checksum    32 bytes  sha256 of the payload
+    length      uint64    payload size in bytes
+
+Payload, with components in config_loader.CONFIG_FILES order:
+
+    sources     per component: int64 mtime_ns, int64 size of the source
+                JSON file when the artifact was built (-1, -1 if missing)
+    configs     per component: uint32 byte length, UTF-8 JSON document
+    tables      uint32 activity count, then per rule_engine.export_tables()
+                entry: str sector, str normalized activity, str activity
+                key, str field, uint32 point count n, n float64 points,
+                n int32 point rule indexes, n + 1 int32 band rule indexes,
+                int32 missing rule index (-1 meaning no rule)
+
+A pipeline only loads the artifact when it was built by the current rule
+compiler and every source file still has the recorded mtime and size;
+otherwise it falls back to the JSON files. Nothing is hashed or parsed
+from the JSON files to make that check.
+"""
+
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import struct
+
+from app.config_loader import CONFIG_FILES
+from app.rule_engine import RULES_COMPILER_VERSION, compile_rules, export_tables
+
+ARTIFACT_NAME = "rules.bin"
+ARTIFACT_MAGIC = b"DSSRULE1"
+# 2: struct layout with source mtimes/sizes (1 was a marshal payload)
+ARTIFACT_FORMAT = 2
+_HEADER = struct.Struct("<8sHH32sQ")
+_SOURCE = struct.Struct("<qq")
+_UINT16 = struct.Struct("<H")
+_UINT32 = struct.Struct("<I")
+_INT32 = struct.Struct("<i")
+
+logger = logging.getLogger("rule_artifact")
+
+
+class ArtifactError(ValueError):
+    pass
+
+
+def artifact_path(config_dir) -> Path:
+    return Path(config_dir) / ARTIFACT_NAME
+
+
+def build_artifact(config_dir, output=None) -> Path:
+    """Compile the config files in config_dir into a checksummed artifact."""
+    # Stat before reading, so a file changed in between reads as stale later
+    sources = _source_stats(config_dir)
+    documents = {}
+    for component, filename in CONFIG_FILES.items():
+        with open(os.path.join(config_dir, filename), "rb") as f:
+            documents[component] = f.read()
+    dss_rules = json.loads(documents["dss_rules"])
+    tables = export_tables(compile_rules(dss_rules), dss_rules)
+
+    parts = [_SOURCE.pack(*stat) for stat in sources.values()]
+    for document in documents.values():
+        parts += [_UINT32.pack(len(document)), document]
+    parts.append(_pack_tables(tables))
+    payload = b"".join(parts)
+    header = _HEADER.pack(ARTIFACT_MAGIC, ARTIFACT_FORMAT, RULES_COMPILER_VERSION, hashlib.sha256(payload).digest(), len(payload))
+
+    path = Path(output) if output else artifact_path(config_dir)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_artifact(path) -> Dict:
+    """
+    Read and verify an artifact: {"sources", "configs", "tables"}. Raises
+    ArtifactError when it is unusable.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _HEADER.size:
+        raise ArtifactError("truncated header")
+
+    magic, version, compiler, checksum, length = _HEADER.unpack_from(data)
+    if magic != ARTIFACT_MAGIC:
+        raise ArtifactError("not a rules artifact")
+    if version != ARTIFACT_FORMAT:
+        raise ArtifactError(f"unsupported format {version}")
+    if compiler != RULES_COMPILER_VERSION:
+        raise ArtifactError(f"built by rule compiler v{compiler}, this code is v{RULES_COMPILER_VERSION}; rebuild it")
+
+    payload = memoryview(data)[_HEADER.size:]
+    if len(payload) != length:
+        raise ArtifactError("truncated payload")
+    if hashlib.sha256(payload).digest() != checksum:
+        raise ArtifactError("checksum mismatch")
+    try:
+        return _unpack_payload(payload)
+    except (struct.error, UnicodeDecodeError, ValueError) as e:
+        raise ArtifactError(f"corrupt payload: {e}")
+
+
+def load_artifact(config_dir) -> Optional[Dict]:
+    """
+    The artifact in config_dir when it exists, is intact and was built from
+    the current JSON files; None otherwise (callers fall back to JSON).
+    """
+    path = artifact_path(config_dir)
+    if not path.exists():
+        return None
+    try:
+        artifact = read_artifact(path)
+    except (OSError, ArtifactError) as e:
+        logger.warning("Ignoring %s: %s", path, e)
+        return None
+    if artifact["sources"] != _source_stats(config_dir):
+        logger.info("Ignoring stale %s; config files changed since it was built", path)
+        return None
+    return artifact
+
+
+def _source_stats(config_dir) -> Dict[str, Tuple[int, int]]:
+    stats = {}
+    for component, filename in CONFIG_FILES.items():
+        try:
+            stat = os.stat(os.path.join(config_dir, filename))
+            stats[component] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stats[component] = (-1, -1)
+    return stats
+
+
+def _pack_str(text: str) -> bytes:
+    data = text.encode("utf-8")
+    return _UINT16.pack(len(data)) + data
+
+
+def _pack_tables(tables: Dict) -> bytes:
+    entries = [(sector, key, entry) for sector, table in tables.items() for key, entry in table.items()]
+    parts = [_UINT32.pack(len(entries))]
+    for sector, key, (activity_key, field, points, point_rules, band_rules, missing_rule) in entries:
+        count = len(points)
+        parts += [
+            _pack_str(sector), _pack_str(key), _pack_str(activity_key), _pack_str(field),
+            _UINT32.pack(count),
+            struct.pack(f"<{count}d", *points),
+            struct.pack(f"<{count}i", *point_rules),
+            struct.pack(f"<{count + 1}i", *band_rules),
+            _INT32.pack(missing_rule)
+        ]
+    return b"".join(parts)
+
+
+def _unpack_payload(payload) -> Dict:
+    unpack = struct.unpack_from
+    offset = 0
+    sources = {}
+    for component in CONFIG_FILES:
+        sources[component] = _SOURCE.unpack_from(payload, offset)
+        offset += _SOURCE.size
+
+    configs = {}
+    for component in CONFIG_FILES:
+        (size,) = _UINT32.unpack_from(payload, offset)
+        offset += _UINT32.size
+        configs[component] = json.loads(_slice(payload, offset, size))
+        offset += size
+
+    tables: Dict[str, Dict] = {}
+    (count,) = _UINT32.unpack_from(payload, offset)
+    offset += _UINT32.size
+    for _ in range(count):
+        texts = []
+        for _ in range(4):
+            (size,) = _UINT16.unpack_from(payload, offset)
+            offset += _UINT16.size
+            texts.append(_slice(payload, offset, size).decode("utf-8"))
+            offset += size
+        sector, key, activity_key, field = texts
+        (points,) = _UINT32.unpack_from(payload, offset)
+        offset += _UINT32.size
+        point_values = unpack(f"<{points}d", payload, offset)
+        offset += 8 * points
+        point_rules = unpack(f"<{points}i", payload, offset)
+        offset += 4 * points
+        band_rules = unpack(f"<{points + 1}i", payload, offset)
+        offset += 4 * (points + 1)
+        (missing_rule,) = _INT32.unpack_from(payload, offset)
+        offset += _INT32.size
+        tables.setdefault(sector, {})[key] = (activity_key, field, point_values, point_rules, band_rules, missing_rule)
+
+    if offset != len(payload):
+        raise ArtifactError("trailing bytes after tables")
+    return {"sources": sources, "configs": configs, "tables": tables}
+
+
+def _slice(payload, offset: int, size: int) -> bytes:
+    if offset + size > len(payload):
+        raise ArtifactError("section runs past the payload")
+    return bytes(payload[offset:offset + size])
@@ -1,12 +1,28 @@
-from typing import Dict
-from app.activity_similarity import ActivitySimilarityEngine
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+from app.activity_similarity import SIMILARITY_THRESHOLD, create_similarity_engine
+from app.canonical import CanonicalProject
+from app.metrics import SIMILARITY_CACHE
+from app.ttl_cache import TTLCache
+from llm_agent.singleflight import SingleFlight
+import numpy as np
+import asyncio
 import logging
+import operator
+import os
 
 METRIC_SEMANTICS = {
     "capacity": {"effective_capacity", "proposed_capacity", "existing_capacity", "power_generation_mw", "hydro_capacity_mw"},
     "absolute": {"sand_extraction_m3_per_year", "coal_production_mtpA", "minor_mineral_area_ha", "max_mining_area_ha", "road_length_km", "built_up_area_sqm", "dam_height_m", "sugar_crushing_tcd"}
 }
 
+# Version of the compiled rule tables (compile_rules / export_tables). Bump it
+# whenever their semantics change, so precompiled artifacts built by older
+# code are rejected instead of loaded with stale tables.
+# 2: between intervals and all-conditions in band tables
+# 3: ==/!= against non-numeric values compared as labels, outside band tables
+RULES_COMPILER_VERSION = 3
+
 logger = logging.getLogger("dss.semantic_similarity")
 logger.setLevel(logging.INFO)
 if not logger.handlers:
@@ -14,107 +30,601 @@ if not logger.handlers:
     handler.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(message)s"))
     logger.addHandler(handler)
 
-SIMILARITY_THRESHOLD = 0.85
+# (sector, activity keys) -> engine. Keyed by the vocabulary rather than the
+# sector alone so requests still running on an older rules snapshot never
+# pick up (or leave behind) an engine built for different activities.
 _similarity_engines = {}
 
-def classify_by_rules(canonical: Dict, dss_rules: Dict) -> Dict:
-    identity = canonical.get("project_identity", {})
-    sector = identity.get("sector", "").lower()
-    activity = identity.get("activity", "").lower()
+# (engine, normalized activity) -> (closest, score), including below-threshold misses
+_similarity_results = TTLCache(
+    maxsize=int(os.getenv("SIMILARITY_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("SIMILARITY_CACHE_TTL", "3600"))
+)
 
-    sector_rules = dss_rules.get(sector)
-    if not sector_rules:
-        return _fallback()
 
-    # STEP 1: Exact match rules
-    for activity_key, rules in sector_rules.items():
-        if activity_key == activity:
-            for rule in rules:
-                if "condition" not in rule:
-                    return _result(rule)
-                if _evaluate_condition(rule["condition"], canonical):
-                    return _result(rule)
+# Concurrent misses for the same (engine, activity) share one model call
+_similarity_flights = SingleFlight()
 
-    # STEP 2: Semantic fallback
-    if activity:
-        if sector not in _similarity_engines:
-            _similarity_engines[sector] = ActivitySimilarityEngine(sector_rules.keys())
-        engine = _similarity_engines[sector]
-        closest, score = engine.find_closest(activity)
-        if score >= SIMILARITY_THRESHOLD and closest != activity and not canonical.get('_similarity_used', False):  # Fixed: Prevent infinite loop
-            canonical['_similarity_used'] = True
-            canonical["derived_parameters"]["activity_matched_by"] = "semantic_similarity"
-            canonical["derived_parameters"]["similarity_score"] = score
-            identity["activity"] = closest
-            return classify_by_rules(canonical, dss_rules)
 
-    return _fallback()
+def reset_similarity_cache():
+    """Drop cached engines and find_closest results; call after rules are reloaded."""
+    _similarity_engines.clear()
+    _similarity_results.clear()
+
+OPERATORS = {
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+    "==": operator.eq,
+    "!=": operator.ne
+}
+
+# Operators that may also compare labels ("major", true) instead of numbers
+EQUALITY_OPERATORS = {"==", "!="}
+
+
+class InvalidFieldValue(ValueError):
+    """A numeric rule field holds a value that is not a number."""
+
+    def __init__(self, field: str, value):
+        super().__init__(f"{field} is not a number: {value!r}")
+        self.field = field
+        self.value = value
+
+# `closed` of a between condition -> (lower bound operator, upper bound operator)
+INTERVAL_BOUNDS = {
+    "left": (operator.ge, operator.lt),
+    "right": (operator.gt, operator.le),
+    "both": (operator.ge, operator.le),
+    "neither": (operator.gt, operator.lt)
+}
+
+
+def interval_test(bounds, closed: str = "left") -> Optional[Callable[[float], bool]]:
+    """
+    Test for a `{"between": [lo, hi], "closed": ...}` condition. `closed`
+    follows pandas.Interval: "left" (the default, lo <= v < hi), "right",
+    "both" or "neither". None when the bounds or `closed` are invalid.
+    """
+    try:
+        lo, hi = (float(bound) for bound in bounds)
+    except (TypeError, ValueError):
+        return None
+    if closed not in INTERVAL_BOUNDS or lo > hi:
+        return None
+    above, below = INTERVAL_BOUNDS[closed]
+    return lambda value: above(value, lo) and below(value, hi)
+
+
+def normalize_activity(text: str) -> str:
+    return text.strip().lower()
+
+
+class CompiledActivity:
+    """
+    Decision table for a single activity.
+
+    When every condition reads the same numeric field the rules are folded
+    into sorted threshold bands, so a match is one field lookup plus a
+    bisect. Anything else keeps first-match order over precompiled predicates.
+    """
+    __slots__ = ("key", "field", "fields", "rule_fields", "points", "point_rules", "band_rules", "missing_rule", "predicates")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.field = None
+        # Every field the reachable rules read
+        self.fields: Tuple[str, ...] = ()
+        # id(rule) -> fields that rule reads, for the decision_fields report
+        self.rule_fields: Dict[int, Tuple[str, ...]] = {}
+        self.points: List[float] = []
+        self.point_rules: List[Optional[Dict]] = []
+        self.band_rules: List[Optional[Dict]] = [None]
+        self.missing_rule: Optional[Dict] = None
+        self.predicates: List[Tuple[Optional[Callable], Dict]] = []
+
+    def match(self, canonical: CanonicalProject) -> Optional[Dict]:
+        if self.field is None:
+            for predicate, rule in self.predicates:
+                if predicate is None or predicate(canonical):
+                    return rule
+            return None
+
+        value = _field_number(canonical, self.field)
+        if value is None:
+            return self.missing_rule
+        return self.lookup(value)
+
+    def lookup(self, value: float) -> Optional[Dict]:
+        idx = bisect_left(self.points, value)
+        if idx < len(self.points) and self.points[idx] == value:
+            return self.point_rules[idx]
+        return self.band_rules[idx]
+
+
+class CompiledRules:
+    """
+    dss_rules.json compiled once per pipeline: sector -> normalized activity -> CompiledActivity.
+    """
+    __slots__ = ("sectors", "activity_keys")
+
+    def __init__(self):
+        self.sectors: Dict[str, Dict[str, CompiledActivity]] = {}
+        self.activity_keys: Dict[str, Tuple[str, ...]] = {}
 
-def _evaluate_condition(condition: dict, canonical: dict) -> bool:
+    def lookup(self, sector: str, activity: str) -> Optional[CompiledActivity]:
+        return self.sectors.get(sector, {}).get(normalize_activity(activity))
+
+
+def compile_rules(dss_rules: Dict, tables: Optional[Dict] = None) -> CompiledRules:
+    """
+    `tables` are band tables previously produced by export_tables() for the
+    same rules (e.g. from the precompiled artifact); activities found there
+    skip re-tabulation.
+    """
+    tables = tables or {}
+    compiled = CompiledRules()
+    for sector, sector_rules in dss_rules.items():
+        table = {}
+        sector_tables = tables.get(sector, {})
+        for activity_key, rules in sector_rules.items():
+            key = normalize_activity(activity_key)
+            if key in table:
+                continue
+            entry = sector_tables.get(key)
+            if entry is not None and entry[0] == activity_key:
+                table[key] = _restore_activity(activity_key, rules, entry)
+            else:
+                table[key] = _compile_activity(activity_key, rules)
+        compiled.sectors[sector] = table
+        compiled.activity_keys[sector] = tuple(sector_rules.keys())
+    return compiled
+
+
+def export_tables(compiled: CompiledRules, dss_rules: Dict) -> Dict:
+    """
+    Band tables of every single-field activity as plain data:
+    sector -> normalized activity -> (activity key, field, points, point rule
+    indexes, band rule indexes, missing rule index). Rules are referenced by
+    their index in dss_rules, -1 meaning no rule.
+    """
+    tables = {}
+    for sector, table in compiled.sectors.items():
+        for key, activity in table.items():
+            if activity.field is None:
+                continue
+            rules = dss_rules[sector][activity.key]
+            index = {id(rule): idx for idx, rule in enumerate(rules)}
+            position = lambda rule: -1 if rule is None else index[id(rule)]
+            tables.setdefault(sector, {})[key] = (
+                activity.key,
+                activity.field,
+                tuple(activity.points),
+                tuple(position(rule) for rule in activity.point_rules),
+                tuple(position(rule) for rule in activity.band_rules),
+                position(activity.missing_rule)
+            )
+    return tables
+
+
+def _restore_activity(activity_key: str, rules: List[Dict], entry) -> CompiledActivity:
+    _, field, points, point_rules, band_rules, missing_rule = entry
+    rule_at = lambda idx: None if idx < 0 else rules[idx]
+    compiled = CompiledActivity(activity_key)
+    compiled.field = field
+    compiled.fields = (field,)
+    compiled.rule_fields = _rule_fields(rules)
+    compiled.points = list(points)
+    compiled.point_rules = [rule_at(idx) for idx in point_rules]
+    compiled.band_rules = [rule_at(idx) for idx in band_rules]
+    compiled.missing_rule = rule_at(missing_rule)
+    return compiled
+
+
+def _compile_activity(activity_key: str, rules: List[Dict]) -> CompiledActivity:
+    compiled = CompiledActivity(activity_key)
+
+    # Rules after the first unconditional one can never fire
+    reachable = []
+    for rule in rules:
+        reachable.append(rule)
+        if "condition" not in rule:
+            break
+    compiled.rule_fields = _rule_fields(reachable)
+    compiled.fields = _unique_fields(field for fields in compiled.rule_fields.values() for field in fields)
+
+    banded = [_compile_value_condition(rule["condition"]) if "condition" in rule else None for rule in reachable]
+    fields = {entry[0] for entry in banded if entry is not None}
+    if len(fields) != 1 or any(entry is None for entry, rule in zip(banded, reachable) if "condition" in rule):
+        compiled.predicates = [
+            (_compile_condition(rule["condition"]) if "condition" in rule else None, rule)
+            for rule in reachable
+        ]
+        return compiled
+
+    # Single numeric field: tabulate the first matching rule at every threshold and in every band between them
+    compiled.field = fields.pop()
+    tests = [(entry[1] if entry else None, rule) for entry, rule in zip(banded, reachable)]
+    points = sorted({point for entry in banded if entry for point in entry[2]})
+
+    def first_match(value):
+        for test, rule in tests:
+            if test is None or test(value):
+                return rule
+        return None
+
+    samples = [points[0] - 1.0] if points else [0.0]
+    samples += [(lo + hi) / 2 for lo, hi in zip(points, points[1:])]
+    if points:
+        samples.append(points[-1] + 1.0)
+
+    compiled.points = points
+    compiled.point_rules = [first_match(point) for point in points]
+    compiled.band_rules = [first_match(sample) for sample in samples]
+    compiled.missing_rule = next((rule for test, rule in tests if test is None), None)
+    return compiled
+
+
+def condition_fields(condition: Optional[Dict]) -> List[str]:
+    """Fields read by a rule condition, in order, including inside all/any."""
+    if not isinstance(condition, dict):
+        return []
+    for combinator in ("all", "any"):
+        if combinator in condition:
+            return [field for part in condition[combinator] for field in condition_fields(part)]
+    field = condition.get("field")
+    return [field] if field else []
+
+
+def _unique_fields(fields) -> Tuple[str, ...]:
+    return tuple(dict.fromkeys(fields))
+
+
+def _rule_fields(rules: List[Dict]) -> Dict[int, Tuple[str, ...]]:
+    return {id(rule): _unique_fields(condition_fields(rule.get("condition"))) for rule in rules}
+
+
+def _compile_value_condition(condition: Dict):
+    """
+    Compile a condition that reads a single field into (field, test(value), thresholds).
+    Returns None when the condition spans several fields.
+    """
+    for combinator, combine in (("any", any), ("all", all)):
+        if combinator not in condition:
+            continue
+        parts = [_compile_value_condition(c) for c in condition[combinator] if isinstance(c, dict)]
+        if not parts or any(part is None for part in parts) or len({part[0] for part in parts}) != 1:
+            return None
+        tests = [part[1] for part in parts]
+        return parts[0][0], lambda value: combine(test(value) for test in tests), [p for part in parts for p in part[2]]
+
+    field = condition.get("field")
+    if not field or _compares_labels(condition):
+        return None
+
+    test = _compile_comparator(condition)
+    if test is _never:
+        return field, test, []
+    if "between" in condition:
+        return field, test, [float(bound) for bound in condition["between"]]
+    return field, test, [float(condition.get("value"))]
+
+
+def _compile_condition(condition: Dict) -> Callable[[Dict], bool]:
     if "any" in condition:
-        return any(_evaluate_condition(c, canonical) for c in condition["any"] if isinstance(c, dict))
+        parts = [_compile_condition(c) for c in condition["any"] if isinstance(c, dict)]
+        return lambda canonical: any(part(canonical) for part in parts)
+    if "all" in condition:
+        parts = [_compile_condition(c) for c in condition["all"] if isinstance(c, dict)]
+        return lambda canonical: bool(parts) and all(part(canonical) for part in parts)
 
     field = condition.get("field")
     if not field:
-        return False
+        return lambda canonical: False
 
-    value = _resolve_field_value(canonical, field)
-    if value is None:
-        return False
+    if _compares_labels(condition):
+        test = _compile_label_comparator(condition)
 
+        def label_predicate(canonical):
+            value = _field_value(canonical, field)
+            return value is not None and test(value)
+        return label_predicate
+
+    test = _compile_comparator(condition)
+
+    def predicate(canonical):
+        value = _field_number(canonical, field)
+        return value is not None and test(value)
+    return predicate
+
+
+def _compile_comparator(condition: Dict) -> Callable[[float], bool]:
+    if "between" in condition:
+        return interval_test(condition["between"], condition.get("closed", "left")) or _never
+
+    compare = OPERATORS.get(condition.get("op"))
+    threshold = _numeric_threshold(condition.get("value"))
+    if compare is None or threshold is None:
+        return _never
+    return lambda value: compare(value, threshold)
+
+
+def _compares_labels(condition: Dict) -> bool:
+    """==/!= against a value that is not a number, e.g. port_type == "major"."""
+    return (
+        "between" not in condition
+        and condition.get("op") in EQUALITY_OPERATORS
+        and _numeric_threshold(condition.get("value")) is None
+    )
+
+
+def _compile_label_comparator(condition: Dict) -> Callable[[object], bool]:
+    """
+    Compare the raw field value with the rule value. Text is compared
+    case-insensitively; a boolean rule value only matches a boolean.
+    """
+    expected = _normalize_label(condition.get("value"))
+    if isinstance(expected, bool):
+        equal = lambda value: isinstance(value, bool) and value == expected
+    else:
+        equal = lambda value: not isinstance(value, bool) and _normalize_label(value) == expected
+    if condition["op"] == "==":
+        return equal
+    return lambda value: not equal(value)
+
+
+def _normalize_label(value):
+    return value.strip().lower() if isinstance(value, str) else value
+
+
+def _numeric_threshold(value) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
     try:
-        value = float(value) if not isinstance(value, dict) else float(value.get("value", value))
-        threshold = float(condition.get("value"))
+        return float(value)
     except (TypeError, ValueError):
-        return False
-
-    op = condition.get("op")
-    if op == ">=":
-        return value >= threshold
-    if op == ">":
-        return value > threshold
-    if op == "<=":
-        return value <= threshold
-    if op == "<":
-        return value < threshold
-    if op == "==":
-        return value == threshold
+        return None
+
+
+def _never(value) -> bool:
     return False
 
-def _resolve_field_value(canonical: Dict, field: str):
-    # Check derived_parameters first
-    derived = canonical.get("derived_parameters", {})
-    if field in derived and derived[field] is not None:
-        val = derived[field]
-        return float(val["value"]) if isinstance(val, dict) and "value" in val else float(val)
 
-    # Then check form1_part_a
-    form1 = canonical.get("form1_part_a", {})
-    if field in form1 and form1[field] is not None:
-        val = form1[field]
-        return float(val["value"]) if isinstance(val, dict) and "value" in val else float(val)
+def _field_number(canonical: CanonicalProject, field: str) -> Optional[float]:
+    """
+    Numeric value of a rule field; None when it is absent (or NaN). Raises
+    InvalidFieldValue when the field holds something that is not a number.
+    """
+    value = _field_value(canonical, field)
+    if value is None:
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise InvalidFieldValue(field, value) from None
+    return None if number != number else number
+
+
+def classify_by_rules(canonical: CanonicalProject, dss_rules) -> Dict:
+    rules = dss_rules if isinstance(dss_rules, CompiledRules) else compile_rules(dss_rules)
+    result, similarity_query = _classify_exact(canonical, rules)
+    if similarity_query is None:
+        return result
+
+    # STEP 2: Semantic fallback
+    sector, activity = similarity_query
+    engine, threshold = _similarity_engine(sector, rules)
+    match = _cached_match(engine, activity)
+    if match is None:
+        match = _similarity_flights.do(
+            (engine, normalize_activity(activity)),
+            lambda: _remember_match(engine, activity, engine.find_closest(activity))
+        )
+    return _classify_similar(canonical, rules, activity, match, threshold)
+
+
+async def aclassify_by_rules(canonical: CanonicalProject, dss_rules) -> Dict:
+    """
+    classify_by_rules for the event loop: the semantic fallback awaits the
+    engine's afind_closest when it has one instead of blocking a thread.
+    """
+    rules = dss_rules if isinstance(dss_rules, CompiledRules) else compile_rules(dss_rules)
+    result, similarity_query = _classify_exact(canonical, rules)
+    if similarity_query is None:
+        return result
+
+    sector, activity = similarity_query
+    if (sector, rules.activity_keys[sector]) in _similarity_engines:
+        engine, threshold = _similarity_engine(sector, rules)
+    else:
+        # First use embeds the whole activity table; keep that off the loop
+        engine, threshold = await asyncio.get_running_loop().run_in_executor(None, _similarity_engine, sector, rules)
+
+    match = _cached_match(engine, activity)
+    if match is None:
+        async def lookup():
+            afind_closest = getattr(engine, "afind_closest", None)
+            found = await afind_closest(activity) if afind_closest else engine.find_closest(activity)
+            return _remember_match(engine, activity, found)
+        match = await _similarity_flights.ado((engine, normalize_activity(activity)), lookup)
+    return _classify_similar(canonical, rules, activity, match, threshold)
+
+
+def _classify_exact(canonical: CanonicalProject, rules: CompiledRules):
+    """
+    STEP 1: exact match via the normalized activity index. Returns
+    (result, None) when decided, or (None, (sector, activity)) when the
+    semantic fallback should be tried.
+    """
+    identity = canonical.project_identity
+    sector = identity.get("sector", "").lower()
+    activity = identity.get("activity", "").lower()
+
+    sector_table = rules.sectors.get(sector)
+    if not sector_table:
+        return _fallback(), None
+
+    compiled = sector_table.get(normalize_activity(activity))
+    if compiled:
+        try:
+            rule = compiled.match(canonical)
+        except InvalidFieldValue as e:
+            return _invalid_field(e), None
+        if rule:
+            return _result(rule, canonical, compiled), None
+
+    if activity and not canonical.similarity_used:
+        return None, (sector, activity)
+    return _fallback(), None
+
+
+def _classify_similar(canonical: CanonicalProject, rules: CompiledRules, activity: str, match: Tuple[str, float], threshold: float) -> Dict:
+    closest, score = match
+    if score >= threshold and closest != activity:
+        identity = canonical.project_identity
+        canonical.similarity_used = True
+        canonical.derived_parameters["activity_matched_by"] = "semantic_similarity"
+        canonical.derived_parameters["similarity_score"] = score
+        identity["activity"] = closest
+        compiled = rules.lookup(identity.get("sector", "").lower(), closest)
+        try:
+            rule = compiled.match(canonical) if compiled else None
+        except InvalidFieldValue as e:
+            return _invalid_field(e)
+        if rule:
+            return _result(rule, canonical, compiled)
+    return _fallback()
+
+
+def _similarity_engine(sector: str, rules: CompiledRules):
+    key = (sector, rules.activity_keys[sector])
+    engine = _similarity_engines.get(key)
+    if engine is None:
+        engine = _similarity_engines[key] = create_similarity_engine(key[1])
+    return engine, getattr(engine, "threshold", SIMILARITY_THRESHOLD)
+
+
+def _cached_match(engine, activity: str) -> Optional[Tuple[str, float]]:
+    match = _similarity_results.get((engine, normalize_activity(activity)))
+    SIMILARITY_CACHE.inc("miss" if match is None else "hit")
+    return match
+
+
+def _remember_match(engine, activity: str, match: Tuple[str, float]) -> Tuple[str, float]:
+    # A zero score is what the engines return when the lookup itself failed; don't pin that
+    if match[1] > 0.0:
+        _similarity_results.set((engine, normalize_activity(activity)), match)
+    return match
+
+
+def classify_batch_by_rules(canonicals: List[CanonicalProject], dss_rules) -> List[Optional[Dict]]:
+    """
+    Classify many canonical documents at once. Records are grouped by
+    (sector, activity) and banded activities are resolved with one vectorized
+    searchsorted per group. Entries left as None (no exact band match) must go
+    through classify_by_rules for the semantic fallback.
+    """
+    rules = dss_rules if isinstance(dss_rules, CompiledRules) else compile_rules(dss_rules)
+    results: List[Optional[Dict]] = [None] * len(canonicals)
+
+    groups: Dict[Tuple[str, str], List[int]] = {}
+    for idx, canonical in enumerate(canonicals):
+        identity = canonical.project_identity
+        key = (identity.get("sector", "").lower(), normalize_activity(identity.get("activity", "")))
+        groups.setdefault(key, []).append(idx)
+
+    for (sector, activity), members in groups.items():
+        compiled = rules.sectors.get(sector, {}).get(activity)
+        if compiled and compiled.field is not None:
+            values = {}
+            for idx in members:
+                try:
+                    values[idx] = _field_number(canonicals[idx], compiled.field)
+                except InvalidFieldValue as e:
+                    results[idx] = _invalid_field(e)
+            for idx, rule in zip(values, _match_band_vector(compiled, list(values.values()))):
+                if rule:
+                    results[idx] = _result(rule, canonicals[idx], compiled)
+    return results
+
+
+def _match_band_vector(compiled: CompiledActivity, field_values: List[Optional[float]]) -> List[Optional[Dict]]:
+    # Absent values (None) become NaN and take the missing rule
+    values = np.array(field_values, dtype=float)
+    missing = np.isnan(values)
+    points = np.asarray(compiled.points, dtype=float)
+
+    idx = np.searchsorted(points, values, side="left")
+    on_point = np.zeros(len(values), dtype=bool)
+    if len(points):
+        on_point = (idx < len(points)) & (points[np.minimum(idx, len(points) - 1)] == values)
+
+    matched = []
+    for i, missing_value, exact in zip(idx.tolist(), missing.tolist(), on_point.tolist()):
+        if missing_value:
+            matched.append(compiled.missing_rule)
+        elif exact:
+            matched.append(compiled.point_rules[i])
+        else:
+            matched.append(compiled.band_rules[i])
+    return matched
+
+
+def _field_value(canonical: CanonicalProject, field: str):
+    """Raw value a rule reads for field, with {"value": ...} blocks unwrapped; None when absent."""
+    # Check derived_parameters first, then form1_part_a and the sensitivity flags
+    for section in (canonical.derived_parameters, canonical.form1_part_a, canonical.environmental_sensitivity):
+        if section.get(field) is not None:
+            return _unwrap(section[field])
 
     # Capacity normalization
     if field in METRIC_SEMANTICS.get("capacity", set()):
-        cap_block = canonical.get("capacity_normalization", {}).get("total_effective_capacity", {})
+        cap_block = canonical.capacity_normalization.get("total_effective_capacity", {})
         if "value" in cap_block:
-            return float(cap_block["value"])
+            return cap_block["value"]
 
     # Absolute metrics
     if field in METRIC_SEMANTICS.get("absolute", set()):
-        for source in [derived, form1, canonical]:
+        for source in [canonical.derived_parameters, canonical.form1_part_a, canonical.extra]:
             if field in source:
-                val = source[field]
-                return float(val) if not isinstance(val, dict) else float(val.get("value", val))
+                return _unwrap(source[field])
 
-    # Fallback
-    if field in canonical:
-        val = canonical[field]
-        return float(val) if not isinstance(val, dict) else float(val.get("value", val))
+    # Fallback: top-level keys outside the canonical sections
+    if field in canonical.extra:
+        return _unwrap(canonical.extra[field])
     return None
 
-def _result(rule: Dict) -> Dict:
-    return {"category": rule["category"], "decision_mode": "RULE_BASED", "triggered_rule": rule.get("reason", "Rule matched"), "confidence": 0.95 if rule["category"] != "B2" else 0.9}
+
+def _unwrap(value):
+    return value.get("value", value) if isinstance(value, dict) else value
+
+
+def _reported_value(canonical: CanonicalProject, field: str):
+    """Field value for decision_fields: the number a threshold compared, else the raw value."""
+    try:
+        return _field_number(canonical, field)
+    except InvalidFieldValue as e:
+        return e.value
+
+def _result(rule: Dict, canonical: CanonicalProject, compiled: CompiledActivity) -> Dict:
+    return {
+        "category": rule["category"],
+        "decision_mode": "RULE_BASED",
+        "triggered_rule": rule.get("reason", "Rule matched"),
+        "confidence": 0.95 if rule["category"] != "B2" else 0.9,
+        # Fields the matched rule read, with the value it compared; an
+        # unconditional fallback reports the thresholds it fell through
+        "decision_fields": {field: _reported_value(canonical, field) for field in compiled.rule_fields[id(rule)] or compiled.fields}
+    }
+
+def _invalid_field(error: InvalidFieldValue) -> Dict:
+    # Not a category: the rules cannot be evaluated until the value is corrected
+    return {
+        "status": "UNDETERMINED",
+        "reason": "Invalid rule field values",
+        "invalid_fields": {error.field: error.value}
+    }
 
 def _fallback() -> Dict:
     return {"category": "B2", "decision_mode": "DEFAULT_FALLBACK", "triggered_rule": "No matching DSS rule", "confidence": 0.6}
@@ -0,0 +1,225 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import io
+import json
+import logging
+import os
+import threading
+
+from app.config_loader import CONFIG_FILES, load_config
+from app.pipeline import ClassificationPipeline
+from app.result_cache import reset_result_cache
+from app.rule_artifact import artifact_path, build_artifact
+from app.rule_engine import reset_similarity_cache
+from excel_to_json_converter import ExcelToJSONConverter
+
+logger = logging.getLogger("rule_store")
+
+
+class RuleStore:
+    """
+    Owns the live ClassificationPipeline.
+
+    A pipeline is an immutable snapshot of the compiled config. Request
+    handlers read `store.pipeline` once and use that object for the whole
+    request. Reloads convert, validate and compile a complete new pipeline
+    off the request path, then publish it with a single reference
+    assignment. The read path takes no lock, and in-flight requests finish
+    on the snapshot they started with.
+    """
+
+    def __init__(self, config_dir: str = "app/config"):
+        self.config_dir = config_dir
+        self.rules_path = Path(config_dir) / "dss_rules.json"
+        self.version = 0
+        self.loaded_at: Optional[datetime] = None
+        self.pipeline: Optional[ClassificationPipeline] = None
+        # Serializes writers (uploads, rollbacks, watcher); readers never take it
+        self._write_lock = threading.RLock()
+        # component -> (mtime_ns, size) of the config file the live snapshot was built from
+        self._stats: Dict[str, Optional[Tuple[int, int]]] = {}
+        # component -> stat of a file that failed to load, so it is reported once
+        self._rejected: Dict[str, Optional[Tuple[int, int]]] = {}
+        # RuleSync keeping other worker processes in step (see app/rule_sync.py)
+        self.sync = None
+        self.reload()
+
+    def publish(self, pipeline: ClassificationPipeline):
+        with self._write_lock:
+            previous = self.pipeline
+            self.version += 1
+            self.loaded_at = datetime.now()
+            self.pipeline = pipeline
+        # Entries are keyed by snapshot, so this only frees the old snapshot's
+        reset_result_cache()
+        if previous is None or previous.compiled_rules is not pipeline.compiled_rules:
+            reset_similarity_cache()
+        if self.sync:
+            self.sync.report()
+
+    def reload(self) -> ClassificationPipeline:
+        """Rebuild the snapshot from the files in config_dir."""
+        with self._write_lock:
+            stats = {component: self._stat(component) for component in CONFIG_FILES}
+            pipeline = ClassificationPipeline(self.config_dir)
+            self.publish(pipeline)
+            self._stats = stats
+            return pipeline
+
+    def reload_changed(self) -> List[str]:
+        """
+        Recompile only the components whose config file changed on disk since
+        the live snapshot was built, and publish the result. A file that fails
+        to parse or validate is skipped (the current rules stay live) and
+        retried once it changes again. Returns the reloaded components.
+        """
+        with self._write_lock:
+            changed = {}
+            for component in CONFIG_FILES:
+                stat = self._stat(component)
+                if stat == self._stats.get(component) or stat is None or stat == self._rejected.get(component):
+                    continue
+                try:
+                    config = load_config(self.config_dir, component)
+                    if component == "dss_rules":
+                        validate_rules(config)
+                except (OSError, ValueError) as e:
+                    self._rejected[component] = stat
+                    logger.warning("Ignoring %s: %s", CONFIG_FILES[component], e)
+                    continue
+                changed[component] = (config, stat)
+
+            if not changed:
+                return []
+            try:
+                pipeline = self.pipeline.updated({component: config for component, (config, _) in changed.items()})
+            except Exception as e:
+                for component, (_, stat) in changed.items():
+                    self._rejected[component] = stat
+                logger.warning("Config reload failed, keeping current rules: %s", e)
+                return []
+
+            self.publish(pipeline)
+            for component, (_, stat) in changed.items():
+                self._stats[component] = stat
+                self._rejected.pop(component, None)
+            logger.info("Reloaded %s", ", ".join(CONFIG_FILES[component] for component in changed))
+            return list(changed)
+
+    def convert_excel(self, excel_path, merge: bool = False) -> Tuple[Dict, str, Dict]:
+        """
+        Convert an uploaded Excel file in-process and publish the result.
+        With `merge` the converted activities are merged into the current
+        dss_rules.json. Returns (rules, converter output, per-row report summary).
+        """
+        with self._write_lock:
+            # Messages of this conversion only; sys.stdout is shared by every thread
+            output = io.StringIO()
+            converter = ExcelToJSONConverter(str(excel_path), output=output)
+            converter.convert()
+            if merge:
+                converter.merge_with_existing(str(self.rules_path))
+            self.apply(converter.rules)
+            return converter.rules, output.getvalue(), converter.report_summary()
+
+    def restore(self, backup_path) -> Dict:
+        """Publish the rules stored in a backup file."""
+        with open(backup_path) as f:
+            rules = json.load(f)
+        self.apply(rules)
+        return rules
+
+    def apply(self, dss_rules: Dict):
+        """
+        Validate and compile `dss_rules`, write them to dss_rules.json and
+        publish the new snapshot. Nothing is written or swapped if any step
+        fails, so the current rules stay live.
+        """
+        with self._write_lock:
+            validate_rules(dss_rules)
+            pipeline = self.pipeline.updated({"dss_rules": dss_rules})
+            write_json_atomic(self.rules_path, dss_rules)
+            self.publish(pipeline)
+            self._stats["dss_rules"] = self._stat("dss_rules")
+            self._refresh_artifact()
+            if self.sync:
+                self.sync.announce()
+
+    def _refresh_artifact(self):
+        """Rebuild the precompiled artifact, if the deployment uses one, so it matches the new rules."""
+        if not artifact_path(self.config_dir).exists():
+            return
+        try:
+            build_artifact(self.config_dir)
+        except Exception as e:
+            logger.warning("Could not rebuild rules artifact: %s", e)
+
+    def _stat(self, component: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(os.path.join(self.config_dir, CONFIG_FILES[component]))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+
+class ConfigWatcher:
+    """
+    Background thread polling the config files' mtime every `interval`
+    seconds and calling RuleStore.reload_changed(), so config pushed by
+    deployment tooling goes live without an admin call or a restart.
+    """
+
+    def __init__(self, store: RuleStore, interval: float):
+        self.store = store
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 1)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.store.reload_changed()
+            except Exception as e:
+                logger.error("Config watcher error: %s", e)
+
+
+def start_config_watcher(store: RuleStore) -> Optional[ConfigWatcher]:
+    """Start a ConfigWatcher when CONFIG_WATCH_INTERVAL (seconds) is set above 0."""
+    interval = float(os.getenv("CONFIG_WATCH_INTERVAL", "0") or 0)
+    if interval <= 0:
+        return None
+    return ConfigWatcher(store, interval).start()
+
+
+def validate_rules(dss_rules: Dict):
+    if not isinstance(dss_rules, dict) or not dss_rules:
+        raise ValueError("DSS rules must be a non-empty object of sectors")
+    for sector, activities in dss_rules.items():
+        if not isinstance(activities, dict):
+            raise ValueError(f"Sector '{sector}' must map activities to rule lists")
+        for activity, rules in activities.items():
+            if not isinstance(rules, list):
+                raise ValueError(f"Rules for {sector}/{activity} must be a list")
+            for rule in rules:
+                if not isinstance(rule, dict) or not rule.get("category"):
+                    raise ValueError(f"Every rule for {sector}/{activity} needs a category")
+                if "condition" in rule and not isinstance(rule["condition"], dict):
+                    raise ValueError(f"Invalid condition in {sector}/{activity}: {rule['condition']!r}")
+
+
+def write_json_atomic(path, data):
+    """Write JSON to a temp file next to `path` and rename it into place."""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
@@ -0,0 +1,205 @@
+from pathlib import Path
+from typing import Dict, List, Optional
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+from app.rule_store import write_json_atomic
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process deployments only
+    fcntl = None
+
+logger = logging.getLogger("rule_sync")
+
+_GENERATION = struct.Struct("<Q")
+
+
+def runtime_dir(config_dir: str) -> Path:
+    """
+    Directory holding the shared generation and worker status files:
+    RULES_STATE_DIR, or a per-config-directory folder under the system temp
+    dir, so a read-only config directory still works.
+    """
+    configured = os.getenv("RULES_STATE_DIR")
+    if configured:
+        return Path(configured)
+    key = hashlib.sha256(os.path.abspath(config_dir).encode()).hexdigest()[:12]
+    return Path(tempfile.gettempdir()) / f"dss-rules-{key}"
+
+
+class GenerationCounter:
+    """
+    Rules generation shared by every worker process: an 8-byte counter in a
+    memory-mapped file. Reads are a plain memory load; bumps take an
+    exclusive file lock.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "a+b")
+        if os.fstat(self._file.fileno()).st_size < _GENERATION.size:
+            self._file.write(b"\0" * _GENERATION.size)
+            self._file.flush()
+        self._map = mmap.mmap(self._file.fileno(), _GENERATION.size)
+
+    def read(self) -> int:
+        return _GENERATION.unpack_from(self._map, 0)[0]
+
+    def bump(self) -> int:
+        if fcntl:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        try:
+            generation = self.read() + 1
+            _GENERATION.pack_into(self._map, 0, generation)
+            self._map.flush()
+            return generation
+        finally:
+            if fcntl:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class RuleSync:
+    """
+    Keeps the RuleStore of every uvicorn worker on the same rules.
+
+    A worker that changes the rules (upload, merge, rollback) bumps the shared
+    generation. Every worker polls the generation each `interval` seconds
+    and, when it moved, reloads the config files that changed on disk. So all
+    workers serve the new rules within one interval. Each worker also writes
+    a small status file that /admin/rules-status reports.
+    """
+
+    def __init__(self, store, interval: float = 1.0):
+        self.store = store
+        self.interval = interval
+        self.pid = os.getpid()
+        self.state_dir = runtime_dir(store.config_dir)
+        self.workers_dir = self.state_dir / "workers"
+        self.workers_dir.mkdir(parents=True, exist_ok=True)
+        self.counter = GenerationCounter(self.state_dir / "generation")
+        self.generation = self.counter.read()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rule-sync", daemon=True)
+
+    def start(self):
+        self.store.sync = self
+        self.report()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=self.interval + 1)
+        self.store.sync = None
+        try:
+            (self.workers_dir / f"{self.pid}.json").unlink()
+        except OSError:
+            pass
+        self.counter.close()
+
+    def announce(self):
+        """Tell the other workers this one just changed the rules on disk."""
+        self.generation = self.counter.bump()
+        self.report()
+
+    def report(self):
+        """Record the snapshot this worker is serving."""
+        pipeline = self.store.pipeline
+        status = {
+            "pid": self.pid,
+            "generation": self.generation,
+            "version": self.store.version,
+            "loaded_at": self.store.loaded_at.isoformat() if self.store.loaded_at else None,
+            "rules_hash": rules_hash(pipeline.dss_rules) if pipeline else None,
+            "loaded_from": getattr(pipeline, "loaded_from", None)
+        }
+        try:
+            write_json_atomic(self.workers_dir / f"{self.pid}.json", status)
+        except OSError as e:
+            logger.warning("Could not write worker status: %s", e)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                generation = self.counter.read()
+                if generation != self.generation:
+                    self.generation = generation
+                    self.store.reload_changed()
+                    self.report()
+            except Exception as e:
+                logger.error("Rule sync error: %s", e)
+
+
+def rules_hash(dss_rules: Dict) -> str:
+    payload = json.dumps(dss_rules, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+def worker_statuses(config_dir: str) -> List[Dict]:
+    """Status of every live worker, dropping files left by exited processes."""
+    statuses = []
+    for path in sorted((runtime_dir(config_dir) / "workers").glob("*.json")):
+        try:
+            with open(path) as f:
+                status = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not _pid_alive(status.get("pid")):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            continue
+        statuses.append(status)
+    return statuses
+
+
+def shared_generation(config_dir: str) -> Optional[int]:
+    path = runtime_dir(config_dir) / "generation"
+    try:
+        with open(path, "rb") as f:
+            return _GENERATION.unpack(f.read(_GENERATION.size))[0]
+    except (OSError, struct.error):
+        return None
+
+
+def start_rule_sync(store) -> Optional[RuleSync]:
+    """
+    Start worker sync; RULES_SYNC_INTERVAL (seconds, default 1) bounds the
+    propagation delay. Returns None, leaving each worker on its own rules,
+    when the interval is 0 or the runtime directory cannot be written.
+    """
+    interval = float(os.getenv("RULES_SYNC_INTERVAL", "1") or 0)
+    if interval <= 0:
+        return None
+    try:
+        return RuleSync(store, interval).start()
+    except OSError as e:
+        logger.warning("Rule sync disabled, %s is not writable: %s", runtime_dir(store.config_dir), e)
+        return None
+
+
+def _pid_alive(pid) -> bool:
+    if not isinstance(pid, int):
+        return False
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,42 @@
+from typing import Any, Dict, List
+import copy
+import time
+
+
+class Trace:
+    """
+    Per-request record of pipeline stages, enabled with `debug=True`.
+    Each snapshot is a deep copy taken when the stage finishes, with the
+    elapsed time since the request started. Objects exposing to_dict()
+    (the canonical project) are serialized first.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: List[Dict[str, Any]] = []
+
+    def snapshot(self, stage: str, data: Any):
+        if hasattr(data, "to_dict"):
+            data = data.to_dict()
+        self.stages.append({
+            "stage": stage,
+            "elapsed_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "data": copy.deepcopy(data)
+        })
+
+
+class NullTrace:
+    """Stand-in used when tracing is off: records nothing, copies nothing."""
+    enabled = False
+    stages = ()
+
+    def snapshot(self, stage: str, data: Any):
+        pass
+
+
+NULL_TRACE = NullTrace()
+
+
+def start_trace(debug: bool = False):
+    return Trace() if debug else NULL_TRACE
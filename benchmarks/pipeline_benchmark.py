@@ -0,0 +1,445 @@
+"""
+Classification Pipeline Benchmark
+
+Generates synthetic payloads for every sector and activity in dss_rules.json:
+values on, just below and just above every threshold, a value inside every
+band, a missing measure, misspelled activities (semantic fallback),
+override triggers and payloads missing a mandatory field. Then measures:
+
+- `ClassificationPipeline.run` throughput and per-payload latency
+- per-stage latency (field mapping ... rule engine)
+- `ClassificationPipeline.run_batch` throughput
+- end to end through `POST /classify` with an in-process ASGI client
+
+Bedrock is always stubbed: embeddings are hashed character trigrams, so
+misspellings still land close to the right activity, and every call waits
+`--bedrock-latency-ms`. No AWS credentials or network access are needed.
+
+Usage:
+    python -m benchmarks.pipeline_benchmark --output bench.json
+    python -m benchmarks.pipeline_benchmark --rounds 20 --concurrency 32 --compare bench.json
+
+Results are written as JSON; `--compare` prints the change against an
+earlier results file, e.g. one produced on another commit.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import copy
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Reproducible runs: no persistent embedding cache between runs
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+
+import app.metrics as metrics
+from app.activity_similarity import EMBED_DIMENSIONS
+from app.config_loader import load_config
+from app.pipeline import ClassificationPipeline
+from app.rule_engine import reset_similarity_cache
+from llm_agent import bedrock_client
+
+BASE_IDENTITY = {"type_of_proposal": "new", "state": "Maharashtra", "district": "Pune"}
+# Top-level blocks of a raw (client) payload
+RAW_BLOCKS = ("caf.", "form1_part_a.", "environmental_sensitivity.")
+
+
+# ============================================================================
+# BEDROCK STUB
+# ============================================================================
+class StubBedrockRuntime:
+    """Drop-in for BedrockRuntime answering embedding calls locally."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self.calls = 0
+
+    def invoke_model(self, model_id: str, body: dict, timeout: Optional[float] = None) -> dict:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return {"embeddings": [_hashed_embedding(text) for text in body["texts"]]}
+
+    async def ainvoke_model(self, model_id: str, body: dict, timeout: Optional[float] = None) -> dict:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return {"embeddings": [_hashed_embedding(text) for text in body["texts"]]}
+
+
+def _hashed_embedding(text: str) -> List[float]:
+    padded = " {0} ".format(text.lower())
+    vector = np.zeros(EMBED_DIMENSIONS, dtype=np.float32)
+    for i in range(len(padded) - 2):
+        vector[zlib.crc32(padded[i:i + 3].encode()) % EMBED_DIMENSIONS] += 1.0
+    return vector.tolist()
+
+
+# ============================================================================
+# PAYLOADS
+# ============================================================================
+def _condition_bounds(condition: Dict, bounds: Dict[str, set]):
+    for combinator in ("any", "all"):
+        for part in condition.get(combinator, []):
+            _condition_bounds(part, bounds)
+    field = condition.get("field")
+    if not field:
+        return
+    values = condition.get("between") or [condition.get("value")]
+    for value in values:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            bounds[field].add(float(value))
+        elif value is not None:
+            bounds[field].add(value)
+
+
+def _raw_sources(field_mapping: Dict) -> Dict[str, str]:
+    """Canonical field name -> raw payload path that feeds it (effective_capacity is derived from proposed_capacity)."""
+    sources = {"effective_capacity": "form1_part_a.proposed_capacity"}
+    for entry in field_mapping.values():
+        name = entry["canonical_path"].rsplit(".", 1)[-1]
+        raw = [source for source in entry["sources"] if source.startswith(RAW_BLOCKS)]
+        if raw:
+            sources.setdefault(name, raw[0])
+    return sources
+
+
+def _set_path(payload: Dict, path: str, value):
+    *parents, leaf = path.split(".")
+    current = payload
+    for key in parents:
+        current = current.setdefault(key, {})
+    current[leaf] = value
+
+
+def _payload(sector: str, activity: str) -> Dict:
+    return {
+        "caf": {"project_sector": sector, **BASE_IDENTITY},
+        "form1_part_a": {"project_activity": activity}
+    }
+
+
+def _edge_values(points: List[float]) -> List[float]:
+    """Every threshold, just below and above it, the middle of every band and both ends."""
+    if not points:
+        return []
+    values = {point + delta for point in points for delta in (-0.01, 0.0, 0.01)}
+    values.update((low + high) / 2 for low, high in zip(points, points[1:]))
+    values.update((points[0] / 2, points[-1] * 2 + 1))
+    return sorted(round(value, 6) for value in values if value >= 0)
+
+
+def _misspell(text: str, rng: random.Random) -> str:
+    if len(text) < 5:
+        return text + text[-1]
+    i = rng.randrange(1, len(text) - 2)
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def _trigger_value(condition: Dict):
+    for combinator in ("all", "any"):
+        if condition.get(combinator):
+            return _trigger_value(condition[combinator][0])
+    if "between" in condition:
+        low, high = condition["between"]
+        return (low + high) / 2
+    value = condition["value"]
+    return {">": value + 1, ">=": value, "<": value - 1, "<=": value}.get(condition.get("operator"), value)
+
+
+def build_payloads(config_dir: str, seed: int = 7) -> Dict[str, List[Dict]]:
+    """Synthetic payloads grouped by kind; the same seed yields the same payloads."""
+    rng = random.Random(seed)
+    dss_rules = load_config(config_dir, "dss_rules")
+    sources = _raw_sources(load_config(config_dir, "field_mapping"))
+    override_rules = load_config(config_dir, "override_rules")
+    mandatory = load_config(config_dir, "mandatory_rules")
+
+    groups = defaultdict(list)
+    for sector, activities in dss_rules.items():
+        for activity, rules in activities.items():
+            bounds = defaultdict(set)
+            for rule in rules:
+                if "condition" in rule:
+                    _condition_bounds(rule["condition"], bounds)
+
+            path = lambda field: sources.get(field, "form1_part_a." + field)
+            numeric = {field: sorted(p for p in points if isinstance(p, float)) for field, points in bounds.items()}
+            for field, points in bounds.items():
+                # Categorical / boolean conditions: every listed value plus one that matches none
+                labels = [point for point in points if not isinstance(point, float)]
+                values = set(_edge_values(numeric[field])) | set(labels)
+                if any(isinstance(label, str) for label in labels):
+                    values.add("other")
+                values.update(not label for label in labels if isinstance(label, bool))
+                for value in sorted(values, key=str):
+                    payload = _payload(sector, activity)
+                    # The activity's other measures sit below every threshold
+                    for other in numeric:
+                        if other != field and numeric[other]:
+                            _set_path(payload, path(other), 0.0)
+                    _set_path(payload, path(field), value)
+                    groups["threshold"].append(payload)
+
+            groups["missing_measure"].append(_payload(sector, activity))
+            misspelled = _payload(sector, _misspell(activity, rng))
+            for field, points in numeric.items():
+                if points:
+                    _set_path(misspelled, path(field), points[-1])
+            groups["similarity"].append(misspelled)
+
+        for field in mandatory.get("global", []):
+            source = sources.get(field)
+            if source:
+                activity = next(iter(activities))
+                payload = _payload(sector, activity)
+                *parents, leaf = source.split(".")
+                payload.get(parents[0], {}).pop(leaf, None)
+                groups["missing_mandatory"].append(payload)
+
+    some_sector, some_activities = next(iter(dss_rules.items()))
+    some_activity = next(iter(some_activities))
+    for rule in override_rules.get("absolute_overrides", []):
+        payload = _payload(some_sector, some_activity)
+        value = rule["trigger_value"] if "trigger_value" in rule else _trigger_value(rule["trigger_condition"])
+        _set_path(payload, rule["canonical_path"], value)
+        groups["override"].append(payload)
+    for rule in override_rules.get("activity_overrides", []):
+        groups["override"].append(_payload(some_sector, rule["activity_contains"] + " project"))
+    return dict(groups)
+
+
+# ============================================================================
+# MEASUREMENTS
+# ============================================================================
+class StageSamples:
+    """Collects raw stage timings in place of the stage histogram."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def observe(self, value: float, *labels: str):
+        self.samples[labels[0]].append(value)
+
+
+@contextlib.contextmanager
+def recording_stages():
+    histogram, samples = metrics.STAGE_SECONDS, StageSamples()
+    metrics.STAGE_SECONDS = samples
+    try:
+        yield samples
+    finally:
+        metrics.STAGE_SECONDS = histogram
+
+
+def latency_stats(latencies: List[float]) -> Dict:
+    ordered = sorted(latencies)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+    return {
+        "count": len(ordered),
+        "mean_us": round(statistics.fmean(ordered) * 1e6, 2),
+        "p50_us": round(pick(0.50) * 1e6, 2),
+        "p90_us": round(pick(0.90) * 1e6, 2),
+        "p99_us": round(pick(0.99) * 1e6, 2),
+        "max_us": round(ordered[-1] * 1e6, 2)
+    }
+
+
+def bench_run(pipeline: ClassificationPipeline, payloads: List[Dict], rounds: int, warmup: int) -> Dict:
+    reset_similarity_cache()
+    for _ in range(warmup):
+        for payload in payloads:
+            pipeline.run(copy.deepcopy(payload))
+
+    batches = [[copy.deepcopy(payload) for payload in payloads] for _ in range(rounds)]
+    latencies = []
+    with recording_stages() as stages:
+        started = time.perf_counter()
+        for batch in batches:
+            for payload in batch:
+                call_started = time.perf_counter()
+                pipeline.run(payload)
+                latencies.append(time.perf_counter() - call_started)
+        elapsed = time.perf_counter() - started
+
+    return {
+        "records": len(latencies),
+        "seconds": round(elapsed, 4),
+        "records_per_second": round(len(latencies) / elapsed, 1),
+        "latency": latency_stats(latencies),
+        "stages": {stage: latency_stats(values) for stage, values in stages.samples.items()}
+    }
+
+
+def bench_run_batch(pipeline: ClassificationPipeline, payloads: List[Dict], rounds: int, warmup: int, batch_size: int) -> Dict:
+    reset_similarity_cache()
+    for _ in range(warmup):
+        pipeline.run_batch(copy.deepcopy(payloads))
+    chunks = [
+        copy.deepcopy(payloads[start:start + batch_size])
+        for _ in range(rounds)
+        for start in range(0, len(payloads), batch_size)
+    ]
+    started = time.perf_counter()
+    records = sum(len(pipeline.run_batch(chunk)) for chunk in chunks)
+    elapsed = time.perf_counter() - started
+    return {
+        "records": records,
+        "batch_size": batch_size,
+        "seconds": round(elapsed, 4),
+        "records_per_second": round(records / elapsed, 1)
+    }
+
+
+async def bench_asgi(payloads: List[Dict], rounds: int, concurrency: int, config_dir: str) -> Dict:
+    import httpx
+    import app.main as api
+    from app.rule_store import RuleStore
+
+    if config_dir != api.rule_store.config_dir:
+        api.rule_store = RuleStore(config_dir)
+    reset_similarity_cache()
+    # Lifespan events are not run, so no rule sync or config watcher is started
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for payload in payloads:
+            await client.post("/classify", json=payload)
+
+        gate = asyncio.Semaphore(concurrency)
+        latencies, statuses = [], defaultdict(int)
+
+        async def post(payload):
+            async with gate:
+                call_started = time.perf_counter()
+                response = await client.post("/classify", json=payload)
+                latencies.append(time.perf_counter() - call_started)
+                statuses[response.status_code] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(post(payload) for _ in range(rounds) for payload in payloads))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 4),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+        "latency": latency_stats(latencies)
+    }
+
+
+# ============================================================================
+# REPORTING
+# ============================================================================
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(current: Dict, baseline: Dict):
+    """Print throughput and latency changes against a previous results file."""
+    meta = baseline.get("meta", {})
+    print(f"\n📈 Compared with {meta.get('commit') or meta.get('timestamp') or 'baseline'}")
+    rows = [
+        ("run records/s", ("run", "records_per_second")),
+        ("run p50 µs", ("run", "latency", "p50_us")),
+        ("run p99 µs", ("run", "latency", "p99_us")),
+        ("run_batch records/s", ("run_batch", "records_per_second")),
+        ("/classify req/s", ("asgi", "requests_per_second")),
+        ("/classify p99 µs", ("asgi", "latency", "p99_us"))
+    ]
+    for stage in current.get("run", {}).get("stages", {}):
+        rows.append((f"stage {stage} p50 µs", ("run", "stages", stage, "p50_us")))
+
+    for label, path in rows:
+        new, old = current, baseline
+        for key in path:
+            new = new.get(key, {}) if isinstance(new, dict) else {}
+            old = old.get(key, {}) if isinstance(old, dict) else {}
+        if isinstance(new, (int, float)) and isinstance(old, (int, float)) and old:
+            print(f"   - {label}: {old} → {new} ({(new - old) / old * 100:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the classification pipeline with Bedrock stubbed')
+    parser.add_argument('--config-dir', default='app/config', help='Config directory (dss_rules.json etc.)')
+    parser.add_argument('--rounds', type=int, default=5, help='Passes over the generated payloads per measurement')
+    parser.add_argument('--warmup', type=int, default=1, help='Unmeasured passes before measuring run()')
+    parser.add_argument('--batch-size', type=int, default=100, help='Records per run_batch call')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent /classify requests')
+    parser.add_argument('--bedrock-latency-ms', type=float, default=20.0, help='Simulated latency of each stubbed Bedrock call')
+    parser.add_argument('--seed', type=int, default=7, help='Random seed for generated payloads')
+    parser.add_argument('--skip-asgi', action='store_true', help='Only run the in-process measurements')
+    parser.add_argument('--output', help='Write results as JSON')
+    parser.add_argument('--compare', help='Earlier results JSON to compare against')
+    args = parser.parse_args()
+
+    runtime = StubBedrockRuntime(args.bedrock_latency_ms)
+    bedrock_client._shared_runtime = runtime
+
+    groups = build_payloads(args.config_dir, args.seed)
+    payloads = [payload for group in groups.values() for payload in group]
+    pipeline = ClassificationPipeline(args.config_dir)
+    print(f"🔄 {len(payloads)} payloads: " + ", ".join(f"{kind}={len(items)}" for kind, items in groups.items()))
+
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config_dir": args.config_dir,
+            "loaded_from": pipeline.loaded_from,
+            "payloads": {kind: len(items) for kind, items in groups.items()},
+            "args": vars(args)
+        }
+    }
+
+    results["run"] = bench_run(pipeline, payloads, args.rounds, args.warmup)
+    run = results["run"]
+    print(f"\n📊 run(): {run['records_per_second']} records/s | "
+          f"p50={run['latency']['p50_us']}µs p99={run['latency']['p99_us']}µs")
+    for stage, stats in run["stages"].items():
+        print(f"   - {stage}: p50={stats['p50_us']}µs p99={stats['p99_us']}µs (n={stats['count']})")
+
+    results["run_batch"] = bench_run_batch(pipeline, payloads, args.rounds, args.warmup, args.batch_size)
+    print(f"\n📊 run_batch(): {results['run_batch']['records_per_second']} records/s")
+
+    if not args.skip_asgi:
+        results["asgi"] = asyncio.run(bench_asgi(payloads, args.rounds, args.concurrency, args.config_dir))
+        asgi = results["asgi"]
+        print(f"\n📊 POST /classify: {asgi['requests_per_second']} req/s at concurrency {asgi['concurrency']} | "
+              f"p50={asgi['latency']['p50_us']}µs p99={asgi['latency']['p99_us']}µs | {asgi['status_codes']}")
+
+    results["bedrock_stub_calls"] = runtime.calls
+    print(f"\n🔌 Stubbed Bedrock calls: {runtime.calls}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            _compare(results, json.load(f))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
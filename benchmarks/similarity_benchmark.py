@@ -0,0 +1,132 @@
+"""
+Activity Similarity Benchmark
+
+Compares the offline n-gram matcher against the Bedrock embedding matcher
+on the activity vocabulary in dss_rules.json. Queries are generated per
+sector from the real activity keys (typos, spacing/case noise, extra
+words) plus distractors that should NOT match any activity.
+
+Usage:
+    python -m benchmarks.similarity_benchmark
+    python -m benchmarks.similarity_benchmark --bedrock --output similarity_results.json
+
+The Bedrock backend is only measured with --bedrock (requires AWS credentials).
+"""
+
+import argparse
+import json
+import random
+import statistics
+import string
+import time
+from typing import Dict, List, Tuple
+
+from app.activity_similarity import ActivitySimilarityEngine
+from app.ngram_similarity import NgramSimilarityEngine
+
+DISTRACTORS = [
+    "nuclear fuel reprocessing", "textile dyeing unit", "pharmaceutical api",
+    "distillery", "oil and gas exploration", "ship breaking yard",
+    "chlor alkali plant", "leather tannery", "fertilizer complex", "bus depot"
+]
+SUFFIXES = ["plant", "project", "unit", "factory", "works"]
+
+
+def _typo(text: str, rng: random.Random) -> str:
+    if len(text) < 4:
+        return text
+    i = rng.randrange(1, len(text) - 1)
+    kind = rng.choice(["delete", "swap", "replace", "insert"])
+    if kind == "delete":
+        return text[:i] + text[i + 1:]
+    if kind == "swap":
+        return text[:i - 1] + text[i] + text[i - 1] + text[i + 1:]
+    if kind == "replace":
+        return text[:i] + rng.choice(string.ascii_lowercase) + text[i + 1:]
+    return text[:i] + rng.choice(string.ascii_lowercase) + text[i:]
+
+
+def build_queries(activity_keys: List[str], rng: random.Random) -> List[Tuple[str, str]]:
+    """(query, expected activity key or None for distractors)"""
+    queries = []
+    for key in activity_keys:
+        queries.append((key, key))
+        queries.append(("  {0} ".format(key.upper()), key))
+        queries.append((_typo(key, rng), key))
+        queries.append((_typo(_typo(key, rng), rng), key))
+        queries.append(("{0} {1}".format(key, rng.choice(SUFFIXES)), key))
+    queries.extend((distractor, None) for distractor in DISTRACTORS)
+    return queries
+
+
+def evaluate(engine, queries: List[Tuple[str, str]]) -> Dict:
+    latencies = []
+    correct = accepted_wrong = rejected_distractors = 0
+    positives = sum(1 for _, expected in queries if expected is not None)
+    negatives = len(queries) - positives
+
+    for query, expected in queries:
+        started = time.perf_counter()
+        closest, score = engine.find_closest(query.strip().lower())
+        latencies.append(time.perf_counter() - started)
+
+        accepted = score >= engine.threshold
+        if expected is None:
+            rejected_distractors += not accepted
+        elif accepted and closest == expected:
+            correct += 1
+        elif accepted:
+            accepted_wrong += 1
+
+    latencies.sort()
+    return {
+        "queries": len(queries),
+        "recall": round(correct / positives, 4) if positives else None,
+        "wrong_matches": accepted_wrong,
+        "distractor_rejection": round(rejected_distractors / negatives, 4) if negatives else None,
+        "latency_us_p50": round(statistics.median(latencies) * 1e6, 1),
+        "latency_us_p99": round(latencies[int(len(latencies) * 0.99) - 1] * 1e6, 1),
+        "threshold": engine.threshold
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark activity similarity backends')
+    parser.add_argument('--rules', default='app/config/dss_rules.json', help='DSS rules JSON')
+    parser.add_argument('--bedrock', action='store_true', help='Also benchmark the Bedrock embedding backend')
+    parser.add_argument('--seed', type=int, default=7, help='Random seed for generated queries')
+    parser.add_argument('--output', help='Write results as JSON')
+    args = parser.parse_args()
+
+    with open(args.rules) as f:
+        dss_rules = json.load(f)
+
+    backends = {"ngram": NgramSimilarityEngine}
+    if args.bedrock:
+        backends["bedrock"] = ActivitySimilarityEngine
+
+    results = {}
+    for name, engine_cls in backends.items():
+        results[name] = {}
+        for sector, activities in dss_rules.items():
+            keys = list(activities.keys())
+            engine = engine_cls(keys)
+            # Same queries for every backend: seed per sector
+            queries = build_queries(keys, random.Random("{0}:{1}".format(args.seed, sector)))
+            results[name][sector] = evaluate(engine, queries)
+
+    for name, sectors in results.items():
+        print(f"\n📊 {name}")
+        for sector, stats in sectors.items():
+            print(f"   - {sector}: recall={stats['recall']} wrong={stats['wrong_matches']} "
+                  f"distractor_rejection={stats['distractor_rejection']} "
+                  f"p50={stats['latency_us_p50']}µs p99={stats['latency_us_p99']}µs")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,13 +6,16 @@ used by the classification pipeline.
 
 Usage:
     python excel_to_json_converter.py --excel path/to/rules.xlsx --output app/config/dss_rules.json
+    python excel_to_json_converter.py --excel path/to/rules.xlsx --output app/config/dss_rules.json --artifact
+    python excel_to_json_converter.py --output app/config/dss_rules.json --artifact   # artifact only
 """
 
 import openpyxl
 import json
 import re
 import argparse
-from typing import Dict, List, Optional, Any
+import sys
+from typing import Dict, List, Optional, Any, TextIO
 from pathlib import Path
 
 
@@ -84,6 +87,15 @@ ACTIVITY_NORMALIZATION = {
 }
 
 
+# (lower bound inclusive, upper bound inclusive) -> "closed" of a between condition
+INTERVAL_CLOSED = {
+    (True, False): "left",
+    (False, True): "right",
+    (True, True): "both",
+    (False, False): "neither",
+}
+
+
 # ============================================================================
 # CONDITION PARSER
 # ============================================================================
@@ -95,7 +107,7 @@ class ConditionParser:
         """
         Parse condition strings like:
         - ">=0.06" → {"field": "...", "op": ">=", "value": 0.06}
-        - ">=0.03 and <0.06" → Complex range condition
+        - ">=0.03 and <0.06" → {"field": "...", "between": [0.03, 0.06], "closed": "left"}
         - ">0" → {"field": "...", "op": ">", "value": 0}
         - "-" or "NA" or None → No condition (fallback)
         """
@@ -107,14 +119,30 @@ class ConditionParser:
         # Handle range conditions (e.g., ">=0.03 and <0.06")
         if ' and ' in condition_str.lower():
             parts = re.split(r'\s+and\s+', condition_str, flags=re.IGNORECASE)
-            if len(parts) == 2:
-                # This is a range - we'll use the lower bound as primary condition
-                lower = ConditionParser._parse_simple_condition(parts[0], field)
-                return lower
+            conditions = [ConditionParser._parse_simple_condition(part, field) for part in parts]
+            # A bound that does not parse leaves the range unparsed; keeping
+            # only the other bound would turn it into a half-open range
+            if all(conditions):
+                return ConditionParser._combine_range(conditions, field)
+            return None
         
         # Handle simple conditions
         return ConditionParser._parse_simple_condition(condition_str, field)
     
+    @staticmethod
+    def _combine_range(conditions: List[Dict], field: str) -> Dict:
+        """One lower and one upper bound become a between interval; anything else an all"""
+        lower = [c for c in conditions if c["op"] in ('>', '>=')]
+        upper = [c for c in conditions if c["op"] in ('<', '<=')]
+        if len(conditions) == 2 and len(lower) == 1 and len(upper) == 1 and lower[0]["value"] <= upper[0]["value"]:
+            closed = INTERVAL_CLOSED[(lower[0]["op"] == '>=', upper[0]["op"] == '<=')]
+            return {
+                "field": field,
+                "between": [lower[0]["value"], upper[0]["value"]],
+                "closed": closed
+            }
+        return {"all": conditions}
+    
     @staticmethod
     def _parse_simple_condition(condition_str: str, field: str) -> Optional[Dict]:
         """Parse simple condition like '>=0.06' or '>5'"""
@@ -131,64 +159,91 @@ class ConditionParser:
         return None
 
 
+def _cell_text(value) -> str:
+    """Cell value as stripped text; empty cells read as ''"""
+    return str(value).strip() if value is not None else ''
+
+
 # ============================================================================
 # EXCEL TO JSON CONVERTER
 # ============================================================================
 class ExcelToJSONConverter:
     """Convert Excel DSS rules to JSON format"""
     
-    def __init__(self, excel_path: str):
+    def __init__(self, excel_path: str, output: Optional[TextIO] = None):
+        """
+        `output` receives the progress and merge messages (stdout by default),
+        so a server can collect them per conversion.
+        """
         self.excel_path = excel_path
-        self.wb = openpyxl.load_workbook(excel_path)
+        self.output = output or sys.stdout
+        # Read-only mode streams rows from the sheet XML instead of building every cell object
+        self.wb = openpyxl.load_workbook(excel_path, read_only=True, data_only=True)
         self.ws = self.wb.active
         self.rules = {}
+        # Rows that did not convert cleanly, plus a count per row status
+        self.report: List[Dict[str, Any]] = []
+        self.status_counts = {"parsed": 0, "partial": 0, "unparseable": 0, "skipped": 0, "error": 0}
         
     def convert(self) -> Dict:
         """Main conversion logic"""
-        # Read headers
-        headers = [cell.value for cell in self.ws[1]]
-        
-        # Process each row
-        for row_idx in range(2, self.ws.max_row + 1):
-            row_data = {}
-            for col_idx, cell in enumerate(self.ws[row_idx]):
-                if col_idx < len(headers) and headers[col_idx]:
-                    row_data[headers[col_idx]] = cell.value
+        try:
+            rows = self.ws.iter_rows(values_only=True)
             
-            # Skip empty rows
-            if not row_data.get('Activity') or not row_data.get('Sub Activity'):
-                continue
-                
-            # Skip NA rules
-            if row_data.get('cat A') == 'NA' and row_data.get('cat B1') == 'NA':
-                continue
+            # Read headers
+            headers = list(next(rows, None) or [])
             
-            # Process this rule
-            self._process_rule(row_data)
+            # Process each row
+            for row_idx, values in enumerate(rows, start=2):
+                row_data = {
+                    header: value
+                    for header, value in zip(headers, values)
+                    if header
+                }
+                
+                # Skip empty rows
+                if not row_data.get('Activity') or not row_data.get('Sub Activity'):
+                    if any(value not in (None, '') for value in values):
+                        self._report(row_idx, "skipped", reason="missing Activity or Sub Activity")
+                    continue
+                    
+                # Skip NA rules
+                if row_data.get('cat A') == 'NA' and row_data.get('cat B1') == 'NA':
+                    self._report(row_idx, "skipped", activity=_cell_text(row_data.get('Sub Activity')), reason="cat A and cat B1 are NA")
+                    continue
+                
+                # Process this rule
+                try:
+                    self._process_rule(row_data, row_idx)
+                except Exception as e:
+                    self._report(row_idx, "error", activity=_cell_text(row_data.get('Sub Activity')), reason=str(e))
+        finally:
+            self.wb.close()
         
         return self.rules
     
-    def _process_rule(self, row_data: Dict):
+    def _process_rule(self, row_data: Dict, row_idx: int = 0):
         """Process a single rule from Excel row"""
         # Get sector
-        sector_code = row_data.get('Sector', '').strip()
+        sector_code = _cell_text(row_data.get('Sector'))
         sector = SECTOR_MAPPING.get(sector_code, sector_code.lower() if sector_code else 'unknown')
         
         if sector not in self.rules:
             self.rules[sector] = {}
         
         # Use Sub Activity directly (clean it but don't over-normalize)
-        activity_raw = row_data.get('Sub Activity', '').strip()
+        activity_raw = _cell_text(row_data.get('Sub Activity'))
         activity = self._normalize_activity(activity_raw)
         
         if not activity:
+            self._report(row_idx, "skipped", sector=sector, reason="empty Sub Activity")
             return
         
         if activity not in self.rules[sector]:
             self.rules[sector][activity] = []
         
         # Get field name
-        threshold_attr = row_data.get('Threshold Attribute', '').strip().lower()
+        threshold_attr = _cell_text(row_data.get('Threshold Attribute')).lower()
         field = self._get_field_name(threshold_attr, activity)
         
         if not field:
@@ -196,54 +251,68 @@ class ExcelToJSONConverter:
             if sector == "industry":
                 field = "effective_capacity"
             else:
+                self._report(row_idx, "skipped", sector=sector, activity=activity,
+                             reason=f"unknown threshold attribute '{threshold_attr}'")
                 return
         
         # Parse conditions for each category
-        unit = row_data.get('Units', '').strip()
-        
-        # Determine which categories have conditions
-        cat_a_condition = row_data.get('cat A')
-        cat_b1_condition = row_data.get('cat B1')
-        cat_b2_condition = row_data.get('cat B2')
-        
-        has_cat_a = cat_a_condition and str(cat_a_condition).strip() not in ['-', '--', 'NA', 'None', '']
-        has_cat_b1 = cat_b1_condition and str(cat_b1_condition).strip() not in ['-', '--', 'NA', 'None', '']
-        has_cat_b2 = cat_b2_condition and str(cat_b2_condition).strip() not in ['-', '--', 'NA', 'None', '']
+        unit = _cell_text(row_data.get('Units'))
+        added = []
+        unparsed = []
         
-        # Category A
-        if has_cat_a:
-            condition = ConditionParser.parse_condition(str(cat_a_condition), field, unit)
-            if condition:  # Only add if valid condition parsed
-                reason = f"{activity} - Category A"
+        # Category A and B1 carry thresholds; B2 is usually the fallback without a condition
+        for category in ("A", "B1", "B2"):
+            raw_condition = _cell_text(row_data.get(f'cat {category}'))
+            if raw_condition in ['-', '--', 'NA', 'None', '']:
+                continue
+            
+            reason = f"{activity} - Category {category}"
+            if category == "B2":
                 self.rules[sector][activity].append({
-                    "condition": condition,
-                    "category": "A",
+                    "category": "B2",
                     "reason": reason
                 })
-        
-        # Category B1
-        if has_cat_b1:
-            condition = ConditionParser.parse_condition(str(cat_b1_condition), field, unit)
+                added.append(category)
+                continue
+            
+            condition = ConditionParser.parse_condition(raw_condition, field, unit)
             if condition:  # Only add if valid condition parsed
-                reason = f"{activity} - Category B1"
                 self.rules[sector][activity].append({
                     "condition": condition,
-                    "category": "B1",
+                    "category": category,
                     "reason": reason
                 })
-        
-        # Category B2 (usually fallback without condition)
-        if has_cat_b2:
-            reason = f"{activity} - Category B2"
-            # B2 is usually fallback without specific condition
-            self.rules[sector][activity].append({
-                "category": "B2",
-                "reason": reason
-            })
+                added.append(category)
+            else:
+                unparsed.append({"category": category, "condition": raw_condition})
         
         # If no valid rules were added for this activity, remove it
         if not self.rules[sector][activity]:
             del self.rules[sector][activity]
+        
+        if not added:
+            status = "unparseable" if unparsed else "skipped"
+        else:
+            status = "partial" if unparsed else "parsed"
+        self._report(row_idx, status, sector=sector, activity=activity, field=field,
+                     categories=added, unparsed=unparsed,
+                     reason=None if added or unparsed else "no category conditions")
+    
+    def _report(self, row_idx: int, status: str, **details):
+        self.status_counts[status] += 1
+        if status == "parsed":
+            return
+        entry = {"row": row_idx, "status": status}
+        entry.update({key: value for key, value in details.items() if value not in (None, [], "")})
+        self.report.append(entry)
+    
+    def report_summary(self) -> Dict[str, Any]:
+        """Row counts per status plus every row that was not fully parsed"""
+        return {
+            "rows": sum(self.status_counts.values()),
+            **self.status_counts,
+            "problems": self.report
+        }
     
     def _normalize_activity(self, activity_raw: str) -> Optional[str]:
         """Normalize activity name to match existing pipeline conventions"""
@@ -286,7 +355,7 @@ class ExcelToJSONConverter:
         New rules are added, existing rules are preserved unless they have the same sector+activity.
         """
         if not Path(existing_json_path).exists():
-            print(f"⚠️  No existing rules file found at {existing_json_path}, will create new file")
+            print(f"⚠️  No existing rules file found at {existing_json_path}, will create new file", file=self.output)
             return
         
         try:
@@ -320,28 +389,28 @@ class ExcelToJSONConverter:
             self.rules = existing_rules
             
             # Print merge summary
-            print(f"\n📝 Merge Summary:")
+            print(f"\n📝 Merge Summary:", file=self.output)
             if added_sectors:
-                print(f"   ✨ New sectors added: {', '.join(added_sectors)}")
+                print(f"   ✨ New sectors added: {', '.join(added_sectors)}", file=self.output)
             if added_activities:
-                print(f"   ✨ New activities added: {len(added_activities)}")
+                print(f"   ✨ New activities added: {len(added_activities)}", file=self.output)
                 for activity in added_activities[:5]:  # Show first 5
-                    print(f"      - {activity}")
+                    print(f"      - {activity}", file=self.output)
                 if len(added_activities) > 5:
-                    print(f"      ... and {len(added_activities) - 5} more")
+                    print(f"      ... and {len(added_activities) - 5} more", file=self.output)
             if updated_activities:
-                print(f"   🔄 Activities updated: {len(updated_activities)}")
+                print(f"   🔄 Activities updated: {len(updated_activities)}", file=self.output)
                 for activity in updated_activities[:5]:  # Show first 5
-                    print(f"      - {activity}")
+                    print(f"      - {activity}", file=self.output)
                 if len(updated_activities) > 5:
-                    print(f"      ... and {len(updated_activities) - 5} more")
+                    print(f"      ... and {len(updated_activities) - 5} more", file=self.output)
             
         except json.JSONDecodeError as e:
-            print(f"⚠️  Error reading existing JSON: {e}")
-            print(f"   Will overwrite with new rules")
+            print(f"⚠️  Error reading existing JSON: {e}", file=self.output)
+            print(f"   Will overwrite with new rules", file=self.output)
         except Exception as e:
-            print(f"⚠️  Unexpected error during merge: {e}")
-            print(f"   Will overwrite with new rules")
+            print(f"⚠️  Unexpected error during merge: {e}", file=self.output)
+            print(f"   Will overwrite with new rules", file=self.output)
     
     def save_json(self, output_path: str, merge: bool = False):
         """Save rules to JSON file"""
@@ -350,10 +419,10 @@ class ExcelToJSONConverter:
         
         with open(output_path, 'w') as f:
             json.dump(self.rules, f, indent=2)
-        print(f"✅ Rules saved to {output_path}")
-        print(f"📊 Total sectors: {len(self.rules)}")
+        print(f"✅ Rules saved to {output_path}", file=self.output)
+        print(f"📊 Total sectors: {len(self.rules)}", file=self.output)
         for sector, activities in self.rules.items():
-            print(f"   - {sector}: {len(activities)} activities")
+            print(f"   - {sector}: {len(activities)} activities", file=self.output)
 
 
 # ============================================================================
@@ -361,13 +430,22 @@ class ExcelToJSONConverter:
 # ============================================================================
 def main():
     parser = argparse.ArgumentParser(description='Convert Excel DSS rules to JSON')
-    parser.add_argument('--excel', required=True, help='Path to Excel file')
+    parser.add_argument('--excel', help='Path to Excel file')
     parser.add_argument('--output', required=True, help='Output JSON file path')
     parser.add_argument('--merge', action='store_true', 
                         help='Merge with existing rules instead of replacing them')
+    parser.add_argument('--artifact', action='store_true',
+                        help='Also build the precompiled rules artifact (rules.bin) next to the output')
+    parser.add_argument('--report', help='Write the per-row conversion report to this JSON file')
     
     args = parser.parse_args()
     
+    if not args.excel:
+        if not args.artifact:
+            parser.error("--excel is required unless --artifact is given")
+        build_rules_artifact(Path(args.output).parent)
+        return
+    
     # Validate input file exists
     if not Path(args.excel).exists():
         print(f"❌ Error: Excel file not found: {args.excel}")
@@ -378,6 +456,11 @@ def main():
     print(f"🔄 {mode_str.capitalize()} {args.excel} to JSON...")
     converter = ExcelToJSONConverter(args.excel)
     rules = converter.convert()
+    print_report(converter.report_summary())
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(converter.report_summary(), f, indent=2)
+        print(f"📝 Row report saved to {args.report}")
     
     # Save
     converter.save_json(args.output, merge=args.merge)
@@ -385,6 +468,30 @@ def main():
     # Preview
     print("\n📋 Preview of generated rules:")
     print(json.dumps(converter.rules, indent=2)[:500] + "...")
+    
+    if args.artifact:
+        build_rules_artifact(Path(args.output).parent)
+
+
+def print_report(summary: Dict[str, Any]):
+    """Print row counts and the rows that did not convert cleanly"""
+    print(f"📄 Rows: {summary['rows']} | parsed: {summary['parsed']} | partial: {summary['partial']} | "
+          f"unparseable: {summary['unparseable']} | skipped: {summary['skipped']} | errors: {summary['error']}")
+    for entry in summary["problems"][:20]:
+        detail = entry.get("reason") or ", ".join(
+            f"cat {item['category']} '{item['condition']}'" for item in entry.get("unparsed", [])
+        )
+        print(f"   ⚠️  Row {entry['row']} ({entry['status']}) {entry.get('activity', '')}: {detail}")
+    if len(summary["problems"]) > 20:
+        print(f"   ... and {len(summary['problems']) - 20} more")
+
+
+def build_rules_artifact(config_dir: Path):
+    """Compile the config directory into the binary artifact loaded by the API at startup"""
+    from app.rule_artifact import build_artifact
+    
+    path = build_artifact(config_dir)
+    print(f"📦 Rules artifact built: {path} ({path.stat().st_size / 1024:.1f} KB)")
 
 
 if __name__ == "__main__":
@@ -1,14 +1,131 @@
+import asyncio
 import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional
+
 import boto3
+from botocore.config import Config
+
+
+class BedrockTimeoutError(TimeoutError):
+    pass
+
+
+class BedrockRuntime:
+    """
+    Shared bedrock-runtime transport used by the LLM agent and the activity
+    similarity engine.
+
+    - connection pool sized by `max_pool_connections`
+    - `max_in_flight` semaphore bounding concurrent model calls
+    - per-call deadline covering queueing, retries and the response read;
+      botocore's connect and read timeouts are capped at the deadline split
+      across the attempts, so a call the caller gave up on also ends in the
+      worker thread and frees its slot, and a call still queued for a slot
+      when its deadline passes is dropped without being sent
+    - botocore "adaptive" retries (exponential backoff with jitter plus
+      client-side rate limiting on throttling)
+
+    Every setting defaults to a BEDROCK_* environment variable.
+    BEDROCK_ENDPOINT_URL points the client at a local stub server.
+    """
+
+    def __init__(
+        self,
+        max_pool_connections: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        call_timeout: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        endpoint_url: Optional[str] = None,
+        region_name: Optional[str] = None,
+        client=None
+    ):
+        self.max_pool_connections = max_pool_connections or int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "50"))
+        self.max_in_flight = max_in_flight or int(os.getenv("BEDROCK_MAX_IN_FLIGHT", "16"))
+        self.call_timeout = call_timeout or float(os.getenv("BEDROCK_CALL_TIMEOUT", "30"))
+
+        if client is None:
+            max_attempts = max_attempts or int(os.getenv("BEDROCK_MAX_ATTEMPTS", "4"))
+            attempt_timeout = self.call_timeout / max_attempts
+            config = Config(
+                max_pool_connections=self.max_pool_connections,
+                connect_timeout=min(connect_timeout or float(os.getenv("BEDROCK_CONNECT_TIMEOUT", "2")), attempt_timeout),
+                read_timeout=min(read_timeout or float(os.getenv("BEDROCK_READ_TIMEOUT", "20")), attempt_timeout),
+                retries={
+                    "mode": "adaptive",
+                    "max_attempts": max_attempts
+                }
+            )
+            client = boto3.client(
+                "bedrock-runtime",
+                config=config,
+                endpoint_url=endpoint_url or os.getenv("BEDROCK_ENDPOINT_URL") or None,
+                region_name=region_name or os.getenv("AWS_REGION") or None
+            )
+        self.client = client
+
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_pool_connections,
+            thread_name_prefix="bedrock"
+        )
+
+    def invoke_model(self, model_id: str, body: dict, timeout: Optional[float] = None) -> dict:
+        timeout = timeout or self.call_timeout
+        future = self._executor.submit(self._call, model_id, body, time.monotonic() + timeout)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise BedrockTimeoutError(f"Bedrock call to {model_id} exceeded its deadline")
+
+    async def ainvoke_model(self, model_id: str, body: dict, timeout: Optional[float] = None) -> dict:
+        timeout = timeout or self.call_timeout
+        future = asyncio.wrap_future(self._executor.submit(self._call, model_id, body, time.monotonic() + timeout))
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            raise BedrockTimeoutError(f"Bedrock call to {model_id} exceeded its deadline")
+
+    def _call(self, model_id: str, body: dict, deadline: float) -> dict:
+        # The slot is held by this worker thread until botocore returns, not
+        # until the caller stops waiting
+        if not self._slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+            raise BedrockTimeoutError(f"Bedrock call to {model_id} exceeded its deadline waiting for a slot")
+        try:
+            response = self.client.invoke_model(
+                modelId=model_id,
+                body=json.dumps(body)
+            )
+            return json.loads(response["body"].read())
+        finally:
+            self._slots.release()
+
+
+_shared_runtime: Optional[BedrockRuntime] = None
+_shared_runtime_lock = threading.Lock()
+
+
+def get_bedrock_runtime() -> BedrockRuntime:
+    global _shared_runtime
+    with _shared_runtime_lock:
+        if _shared_runtime is None:
+            _shared_runtime = BedrockRuntime()
+        return _shared_runtime
 
 
 class BedrockClient:
-    def __init__(self, model_id="anthropic.claude-3-sonnet-20240229-v1:0"):
-        self.client = boto3.client("bedrock-runtime")
+    def __init__(self, model_id="anthropic.claude-3-sonnet-20240229-v1:0", runtime=None):
+        self.runtime = runtime or get_bedrock_runtime()
         self.model_id = model_id
 
-    def invoke(self, prompt: str) -> str:
-        body = {
+    def _body(self, prompt: str) -> dict:
+        return {
             "anthropic_version": "bedrock-2023-05-31",
             "max_tokens": 800,
             "temperature": 0,
@@ -17,10 +134,10 @@ class BedrockClient:
             ]
         }
 
-        response = self.client.invoke_model(
-            modelId=self.model_id,
-            body=json.dumps(body)
-        )
+    def invoke(self, prompt: str) -> str:
+        response_body = self.runtime.invoke_model(self.model_id, self._body(prompt))
+        return response_body["content"][0]["text"]
 
-        response_body = json.loads(response["body"].read())
+    async def ainvoke(self, prompt: str) -> str:
+        response_body = await self.runtime.ainvoke_model(self.model_id, self._body(prompt))
         return response_body["content"][0]["text"]
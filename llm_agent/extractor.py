@@ -1,9 +1,11 @@
 import logging
 
 import json
+from copy import deepcopy
 from venv import logger
 from llm_agent.schemas import RawProjectInput
 from llm_agent.bedrock_client import BedrockClient
+from llm_agent.singleflight import SingleFlight
 import llm_agent.schemas
 
 logger = logging.getLogger(__name__)
@@ -182,9 +184,25 @@ def remove_empty_values(obj):
 class FieldExtractor:
     def __init__(self):
         self.llm = BedrockClient()
+        # Identical user text in flight at the same time shares one LLM call
+        self._flights = SingleFlight()
 
     def extract(self, user_text: str) -> dict:
-        prompt = f"""
+        return deepcopy(self._flights.do(user_text, self._extract, user_text))
+
+    async def aextract(self, user_text: str) -> dict:
+        return deepcopy(await self._flights.ado(user_text, self._aextract, user_text))
+
+    def _extract(self, user_text: str) -> dict:
+        raw_output = self.llm.invoke(self._build_prompt(user_text))
+        return self._parse_output(raw_output, user_text)
+
+    async def _aextract(self, user_text: str) -> dict:
+        raw_output = await self.llm.ainvoke(self._build_prompt(user_text))
+        return self._parse_output(raw_output, user_text)
+
+    def _build_prompt(self, user_text: str) -> str:
+        return f"""
 {SYSTEM_PROMPT}
 
 Examples:
@@ -198,8 +216,8 @@ User input:\"{user_text}\"
 
 JSON output:
 """
-        raw_output = self.llm.invoke(prompt)
 
+    def _parse_output(self, raw_output: str, user_text: str) -> dict:
         try:
             parsed = json.loads(raw_output)
         except json.JSONDecodeError as e:
@@ -1,6 +1,7 @@
 import re
 import json
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 import requests
 
 from llm_agent.extractor import FieldExtractor
@@ -90,9 +91,9 @@ def parse_numeric_fields(text: str, patterns: dict) -> dict:
 
 # ------------------ Chat Endpoint ------------------
 @app.post("/chat")
-def chat(user_message: str):
+async def chat(user_message: str):
     # 1️⃣ Extract fields using LLM
-    extracted = extractor.extract(user_message)
+    extracted = await extractor.aextract(user_message)
     conversation.merge(extracted)
 
     # 2️⃣ CAF fallback
@@ -119,7 +120,7 @@ def chat(user_message: str):
     print("Raw input after numeric mapping:", json.dumps(conversation.raw_input, indent=2))  # Add this
     # 5️⃣ Call DSS API for error handling
     try:
-        response = requests.post(DSS_API_URL, json=conversation.raw_input, timeout=10)
+        response = await run_in_threadpool(requests.post, DSS_API_URL, json=conversation.raw_input, timeout=10)
         response.raise_for_status()
         response = response.json()
     except requests.RequestException as e:
@@ -127,7 +128,8 @@ def chat(user_message: str):
     
     # 6️⃣ Handle missing mandatory fields (iterative)
     if response.get("status") == "UNDETERMINED":
-        missing = response.get("missing_fields", [])
+        # Invalid rule field values are asked for again like missing ones
+        missing = response.get("missing_fields", []) + list(response.get("invalid_fields", {}))
         conversation.pending_fields = missing  # Fixed: Store for iteration
         return {
             "message": "I need more info:\n- " + "\n- ".join([f"Please provide {f}." for f in missing]),
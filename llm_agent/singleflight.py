@@ -0,0 +1,84 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key: the first caller runs the
+    function, callers arriving while it is in flight wait for and share its
+    result (or exception). Works across threads and event loops, and sync
+    and async callers of the same key join the same flight. If the leader is
+    cancelled or interrupted, a waiting caller retries as the new leader
+    rather than inheriting the cancellation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, Future] = {}
+
+    def _join(self, key: Hashable):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = Future()
+            self._flights[key] = flight
+            return flight, True
+
+    def _land(self, key: Hashable, flight: Future, result: Any = None, error: BaseException = None):
+        """Retire the flight (only if it is still the current one for key) and resolve it."""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        if error is not None:
+            flight.set_exception(error)
+        else:
+            flight.set_result(result)
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args) -> Any:
+        while True:
+            flight, leader = self._join(key)
+            if not leader:
+                try:
+                    return flight.result()
+                except _LeaderGone:
+                    continue
+
+            try:
+                result = fn(*args)
+            except Exception as e:
+                self._land(key, flight, error=e)
+                raise
+            except BaseException:
+                # Cancelled or interrupted: waiting callers retry, one of them as the new leader
+                self._land(key, flight, error=_LeaderGone())
+                raise
+            self._land(key, flight, result)
+            return result
+
+    async def ado(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args) -> Any:
+        while True:
+            flight, leader = self._join(key)
+            if not leader:
+                try:
+                    # Shielded: a follower being cancelled must not cancel the shared flight
+                    return await asyncio.shield(asyncio.wrap_future(flight))
+                except _LeaderGone:
+                    continue
+
+            try:
+                result = await fn(*args)
+            except Exception as e:
+                self._land(key, flight, error=e)
+                raise
+            except BaseException:
+                self._land(key, flight, error=_LeaderGone())
+                raise
+            self._land(key, flight, result)
+            return result
+
+
+class _LeaderGone(Exception):
+    """Set on a flight whose leader was cancelled before finishing."""
@@ -0,0 +1,60 @@
+import random
+
+from app.override_evaluator import AUTOMATON_MIN_KEYWORDS, KeywordAutomaton, compile_override_rules
+
+
+def _linear_first_match(keywords, text):
+    return next((idx for idx, keyword in enumerate(keywords) if keyword in text), None)
+
+
+def test_lowest_rule_index_wins():
+    keywords = ["mining", "coal", "coal mining", "ore"]
+    automaton = KeywordAutomaton(keywords)
+    assert automaton.first_match("opencast coal mining") == 0
+    assert automaton.first_match("coal washery") == 1
+    assert automaton.first_match("iron ore") == 3
+    assert automaton.first_match("cement") is None
+
+
+def test_suffix_keywords_found_through_fallback_links():
+    # "ore" only occurs as a suffix of the longer "bore"/"shore" paths
+    keywords = ["shoreline", "boring", "ore", "re"]
+    automaton = KeywordAutomaton(keywords)
+    assert automaton.first_match("shore") == 2
+    assert automaton.first_match("bore well") == 2
+    assert automaton.first_match("fire") == 3
+    assert automaton.first_match("shoreline boring") == 0
+
+
+def test_automaton_matches_linear_scan_on_overlapping_keywords():
+    rng = random.Random(7)
+    alphabet = "abc "
+    for _ in range(300):
+        keywords = list(dict.fromkeys(
+            "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4)))
+            for _ in range(rng.randint(1, 12))
+        ))
+        automaton = KeywordAutomaton(keywords)
+        for _ in range(20):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+            assert automaton.first_match(text) == _linear_first_match(keywords, text), (keywords, text)
+
+
+def test_compiled_plan_uses_automaton_from_threshold():
+    rules = {"activity_overrides": [
+        {"activity_contains": f"zone {idx}", "reason": f"rule {idx}"}
+        for idx in range(AUTOMATON_MIN_KEYWORDS)
+    ] + [{"activity_contains": "zone 1", "reason": "duplicate"}]}
+    plan = compile_override_rules(rules)
+    assert plan.activity_automaton is not None
+    # "zone 1" is a prefix of "zone 10".."zone 19"; the earlier rule wins, as with the scan
+    assert plan.activity_override("near zone 15") == "rule 1"
+    assert plan.activity_override("zone 3") == "rule 3"
+    assert plan.activity_override("elsewhere") is None
+
+    linear = compile_override_rules({"activity_overrides": rules["activity_overrides"][:AUTOMATON_MIN_KEYWORDS - 1]})
+    assert linear.activity_automaton is None
+    for text in ("near zone 15", "zone 3", "zone 30", "elsewhere"):
+        expected = linear.activity_override(text)
+        if expected is not None:
+            assert plan.activity_override(text) == expected
@@ -0,0 +1,81 @@
+from app.canonical import CanonicalProject
+from app.rule_engine import classify_batch_by_rules, classify_by_rules, compile_rules
+
+PORT_RULES = {
+    "infrastructure": {
+        "port project": [
+            {"category": "A", "reason": "Major port", "condition": {"field": "port_type", "value": "major", "op": "=="}},
+            {"category": "B1", "reason": "Minor port", "condition": {"field": "port_type", "value": "minor", "op": "=="}},
+            {"category": "B2", "reason": "Jetty"}
+        ],
+        "coastal project": [
+            {"category": "A", "reason": "In CRZ", "condition": {"field": "crz_applicable", "value": True, "op": "=="}},
+            {"category": "B2", "reason": "Outside CRZ"}
+        ]
+    },
+    "industry": {
+        "paper mill": [
+            {"category": "A", "reason": "Paper mill >= 300 TPD", "condition": {"field": "effective_capacity", "value": 300, "op": ">="}},
+            {"category": "B1", "reason": "Paper mill 100-300 TPD", "condition": {"field": "effective_capacity", "value": 100, "op": ">="}},
+            {"category": "B2", "reason": "Paper mill < 100 TPD"}
+        ]
+    }
+}
+
+
+def _canonical(sector, activity, **derived):
+    canonical = CanonicalProject()
+    canonical.project_identity.update(sector=sector, activity=activity)
+    canonical.derived_parameters.update(derived)
+    return canonical
+
+
+def _classify(sector, activity, **derived):
+    return classify_by_rules(_canonical(sector, activity, **derived), compile_rules(PORT_RULES))
+
+
+def test_string_equality_rules_match_labels():
+    assert _classify("infrastructure", "port project", port_type="major")["category"] == "A"
+    assert _classify("infrastructure", "port project", port_type=" Minor ")["category"] == "B1"
+    result = _classify("infrastructure", "port project", port_type="jetty")
+    assert (result["category"], result["triggered_rule"]) == ("B2", "Jetty")
+    assert result["decision_fields"] == {"port_type": "jetty"}
+
+
+def test_string_equality_rules_stay_out_of_band_tables():
+    compiled = compile_rules(PORT_RULES).lookup("infrastructure", "port project")
+    assert compiled.field is None
+
+
+def test_boolean_equality_rules_need_a_boolean():
+    compiled = compile_rules(PORT_RULES)
+    canonical = _canonical("infrastructure", "coastal project")
+    canonical.environmental_sensitivity["crz_applicable"] = True
+    assert classify_by_rules(canonical, compiled)["category"] == "A"
+    assert _classify("infrastructure", "coastal project", crz_applicable=False)["category"] == "B2"
+    assert _classify("infrastructure", "coastal project", crz_applicable=1)["category"] == "B2"
+
+
+def test_numeric_band_rules():
+    assert _classify("industry", "paper mill", effective_capacity=300)["category"] == "A"
+    assert _classify("industry", "paper mill", effective_capacity={"value": 150})["category"] == "B1"
+    assert _classify("industry", "paper mill", effective_capacity="99.5")["category"] == "B2"
+    assert compile_rules(PORT_RULES).lookup("industry", "paper mill").field == "effective_capacity"
+
+
+def test_unparseable_numeric_field_is_undetermined():
+    result = _classify("industry", "paper mill", effective_capacity="abc")
+    assert result["status"] == "UNDETERMINED"
+    assert result["invalid_fields"] == {"effective_capacity": "abc"}
+    assert "category" not in result
+
+
+def test_batch_matches_single_classification():
+    compiled = compile_rules(PORT_RULES)
+    canonicals = [
+        _canonical("industry", "paper mill", effective_capacity=value)
+        for value in (50, 100, 299.9, 300, "abc", None)
+    ]
+    batch = classify_batch_by_rules(canonicals, compiled)
+    single = [classify_by_rules(_canonical("industry", "paper mill", effective_capacity=c.derived_parameters["effective_capacity"]), compiled) for c in canonicals]
+    assert batch == single